@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import os
+import time
+import argparse
+import traceback
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from face_recognition import FaceRecognitionSystem, RecognitionResult
+from src.utils.detectors import DetectionTuner
+from src.utils.tracking import FaceTracker, DetectionScheduler
+from src.utils.events import EventPolicy
+from src.utils.sources import create_frame_source, is_live_source, parse_source
+
+EVENTS_DIR = "data/recognition_events"
+
+# Recognizer of each worker process, loaded once by _init_worker
+_face_system = None
+
+def _init_worker(detector_backend):
+    """Load the cached recognizer in a worker process"""
+    global _face_system
+    # Every core already runs its own worker
+    cv2.setNumThreads(1)
+    _face_system = FaceRecognitionSystem(training_workers=1, detector_backend=detector_backend)
+
+def _process_chunk(job):
+    """Recognize the faces in one range of frames
+
+    Returns (frames processed, candidates) where each candidate is the first
+    result of a track recognized with at least min_confidence, as a dict
+    with the footage time and the JPEG-encoded face.
+    """
+    source = create_frame_source(job["path"], fps=job["fps"], start=job["start"], stop=job["stop"],
+                                 step=job["step"], start_time=job["start_time"])
+    if not source.start():
+        return 0, []
+
+    scheduler = DetectionScheduler(DetectionTuner(_face_system.create_place_detector(job["place_id"])).detect)
+    tracker = FaceTracker()
+    recorded = set()
+    candidates = []
+    frames = 0
+    while True:
+        frame = source.next_frame()
+        if frame is None:
+            break
+        frames += 1
+
+        _, results = _face_system.recognize_tracks(frame, tracker, scheduler.update(frame))
+        for result in results:
+            if result.user_id is None or result.confidence < job["min_confidence"]:
+                continue
+            if (result.track_id, result.user_id) in recorded:
+                continue
+            recorded.add((result.track_id, result.user_id))
+            _, image = cv2.imencode('.jpg', result.face_img)
+            candidates.append({
+                "time": source.start_time + source.timestamp,
+                "user_id": result.user_id,
+                "confidence": result.confidence,
+                "difference": result.difference,
+                "image": image.tobytes(),
+            })
+    source.stop()
+    return frames, candidates
+
+def parse_start_time(value):
+    """Parse a local ISO date and time into seconds since the epoch"""
+    return datetime.fromisoformat(value).timestamp()
+
+def plan_jobs(args, start_time):
+    """Split every input into chunks of about chunk_seconds of footage"""
+    jobs = []
+    footage_seconds = 0.0
+    for path in args.inputs:
+        if is_live_source(parse_source(path)):
+            print(f"Error: {path} is a live camera, use multi_camera.py for it")
+            continue
+        source = create_frame_source(path, fps=args.fps, step=args.stride, start_time=start_time)
+        if not source.frame_count:
+            print(f"Error: no frames found in {path}")
+            continue
+        footage_seconds += source.frame_count / source.fps
+        for start, stop in source.chunks(int(args.chunk_seconds * source.fps)):
+            jobs.append({
+                "path": path, "fps": args.fps, "start": start, "stop": stop, "step": args.stride,
+                "start_time": source.start_time, "place_id": args.place,
+                "min_confidence": args.min_confidence,
+            })
+    return jobs, footage_seconds
+
+def save_events(face_system, place_id, candidates, policy):
+    """Apply the event policy in footage order and write the events in bulk"""
+    events = []
+    for candidate in sorted(candidates, key=lambda c: c["time"]):
+        result = RecognitionResult(box=None, user_id=candidate["user_id"], confidence=candidate["confidence"])
+        if not policy.should_record(place_id, result, now=candidate["time"]):
+            continue
+
+        name = face_system.get_user_name(candidate["user_id"])
+        local_time = datetime.fromtimestamp(candidate["time"])
+        image_path = (f"{EVENTS_DIR}/{name}_{candidate['user_id']}_{place_id}_"
+                      f"{local_time.strftime('%Y%m%d_%H%M%S')}.jpg")
+        with open(image_path, 'wb') as f:
+            f.write(candidate["image"])
+        events.append({
+            "user_id": candidate["user_id"],
+            "place_id": place_id,
+            "image_path": image_path,
+            "confidence_score": candidate["confidence"],
+            "difference_score": candidate["difference"],
+            # Stored in UTC like events recorded live
+            "timestamp": datetime.fromtimestamp(candidate["time"], timezone.utc).replace(tzinfo=None),
+        })
+
+    if events:
+        face_system.db.add_recognition_events(events)
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Back-fill recognition events from recorded footage, faster than real time")
+    parser.add_argument('inputs', nargs='+',
+                        help='video files, image sequences (img_%%04d.jpg), directories or globs of stills')
+    parser.add_argument('--place', type=int, default=1, help='place the footage was recorded at')
+    parser.add_argument('--start', type=parse_start_time,
+                        help='local time the footage starts, e.g. 2026-10-01T08:00:00 '
+                             '(default: from the file modification times)')
+    parser.add_argument('--fps', type=float,
+                        help='frame rate of directories of stills (default: use their modification times)')
+    parser.add_argument('--stride', type=int, default=1, help='process every Nth frame')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunk-seconds', type=float, default=60, help='seconds of footage per work item')
+    parser.add_argument('--cooldown', type=float, default=60, help='seconds before the same user is recorded again')
+    parser.add_argument('--min-confidence', type=float, default=0, help='minimum confidence to record an event')
+    parser.add_argument('--detector', help='detector backend (haar, lbp, yunet)')
+    args = parser.parse_args()
+
+    try:
+        os.makedirs(EVENTS_DIR, exist_ok=True)
+        # Trains and caches the model once, so the workers only load it
+        face_system = FaceRecognitionSystem(detector_backend=args.detector)
+        if face_system.db.get_place(args.place) is None:
+            print(f"Error: place {args.place} does not exist")
+            return
+
+        jobs, footage_seconds = plan_jobs(args, args.start)
+        if not jobs:
+            return
+
+        print(f"Processing {footage_seconds:.0f}s of footage in {len(jobs)} chunks "
+              f"with {args.workers} workers...")
+        start = time.perf_counter()
+        total_frames = 0
+        candidates = []
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(args.detector,)) as pool:
+            for n, (frames, found) in enumerate(pool.map(_process_chunk, jobs), 1):
+                total_frames += frames
+                candidates.extend(found)
+                print(f"Chunk {n}/{len(jobs)}: {frames} frames, {len(found)} faces recognized")
+
+        events = save_events(face_system, args.place, candidates, EventPolicy(args.cooldown, args.min_confidence))
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        print(f"\nProcessed {total_frames} frames in {elapsed:.1f}s "
+              f"({total_frames / elapsed:.0f} frames/s, {footage_seconds / elapsed:.1f}x real time)")
+        print(f"Recorded {len(events)} recognition events for place {args.place}")
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Compare face detector backends and downscale factors on a local image set
+
+Usage: python benchmarks/detection_benchmark.py [--images DIR] [--backends haar lbp yunet]
+                                               [--scales 1.0 0.5 0.25] [--labels FILE]
+
+Every frame in DIR is run through each backend (src/utils/detectors.py) at
+each downscale factor, with min_face_size scaled along. The reference faces
+come from --labels, a JSON file mapping image file names to lists of
+[x, y, w, h] boxes. Without labels they are the full-resolution Haar boxes
+(minSize 30x30, the original detect_faces path) at least min_face_size wide.
+A reference box counts as found when a detected box overlaps it with
+IoU >= 0.5.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.detectors import create_detector_backend
+from src.utils.tracking import box_iou
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+IOU_THRESHOLD = 0.5
+
+def load_frames(directory, limit):
+    names, frames = [], []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(directory, name))
+            if image is not None:
+                names.append(name)
+                frames.append(image)
+        if len(frames) >= limit:
+            break
+    return names, frames
+
+def run_detection(backend, frames, repeat):
+    """Return (boxes per frame, mean latency per frame in ms)"""
+    boxes = [backend.detect(frame) for frame in frames]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            backend.detect(frame)
+    return boxes, (time.perf_counter() - start) / (repeat * len(frames)) * 1000
+
+def recall(reference, detected):
+    """Fraction of reference boxes matched by a detected box"""
+    total = sum(len(boxes) for boxes in reference)
+    if total == 0:
+        return float('nan')
+    found = sum(
+        1 for ref_boxes, boxes in zip(reference, detected) for ref in ref_boxes
+        if any(box_iou(ref, box) >= IOU_THRESHOLD for box in boxes)
+    )
+    return found / total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='data/captured', help='directory of full camera frames')
+    parser.add_argument('--labels', help='JSON file of reference boxes per image name')
+    parser.add_argument('--backends', nargs='+', default=['haar', 'lbp', 'yunet'],
+                        help='detector backends to compare')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5, 0.33, 0.25],
+                        help='downscale factors to compare at --min-face-size')
+    parser.add_argument('--min-face-size', type=int, default=120,
+                        help='smallest face of interest, in full-resolution pixels')
+    parser.add_argument('--limit', type=int, default=100, help='maximum number of frames to load')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions')
+    args = parser.parse_args()
+
+    names, frames = load_frames(args.images, args.limit)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+
+    baseline, baseline_ms = run_detection(create_detector_backend('haar'), frames, args.repeat)
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+        reference = [[tuple(box) for box in labels.get(name, [])] for name in names]
+        source = args.labels
+    else:
+        reference = [[box for box in boxes if box[2] >= args.min_face_size] for boxes in baseline]
+        source = f"full-resolution Haar boxes >= {args.min_face_size}px"
+
+    height, width = frames[0].shape[:2]
+    print(f"Frames: {len(frames)} ({width}x{height})  reference faces: "
+          f"{sum(len(boxes) for boxes in reference)} ({source})")
+    print(f"{'backend':>8} {'scale':>6} {'ms/frame':>9} {'speedup':>8} {'recall':>7} {'faces':>6}")
+    print(f"{'haar':>8} {1.0:>6.2f} {baseline_ms:>9.2f} {1.0:>7.1f}x {recall(reference, baseline):>7.3f} "
+          f"{sum(len(boxes) for boxes in baseline):>6}  (minSize 30, original path)")
+
+    for name in args.backends:
+        for scale in args.scales:
+            try:
+                backend = create_detector_backend(name, scale=scale, min_face_size=args.min_face_size)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"{name:>8} skipped: {e}")
+                break
+            detected, ms = run_detection(backend, frames, args.repeat)
+            print(f"{name:>8} {scale:>6.2f} {ms:>9.2f} {baseline_ms / ms:>7.1f}x "
+                  f"{recall(reference, detected):>7.3f} {sum(len(boxes) for boxes in detected):>6}")
+
+if __name__ == "__main__":
+    main()
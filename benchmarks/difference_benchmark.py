@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Compare the 'fast' difference engine against the full-resolution SSIM path
+
+Usage: python benchmarks/difference_benchmark.py [--images DIR] [--limit N]
+
+Every image in DIR is preprocessed like FaceRecognitionSystem does, then
+scored against a perturbed copy of itself (same-face pairs) and against the
+other images (different-face pairs). Reports score agreement and the
+per-comparison latency of both engines.
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from skimage.metrics import structural_similarity as ssim
+from src.utils.difference import MAX_L2, create_difference_engine
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# recognize_face rejects matches whose difference score is at or above this
+DIFFERENCE_THRESHOLD = 70
+
+def preprocess(image):
+    """Same preprocessing as FaceRecognitionSystem.preprocess_face"""
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.equalizeHist(cv2.resize(image, (256, 256)))
+
+def perturb(face, rng):
+    """Simulate another capture of the same face: shift, lighting, noise"""
+    dx, dy = rng.integers(-6, 7, size=2)
+    shifted = cv2.warpAffine(face, np.float32([[1, 0, dx], [0, 1, dy]]), (256, 256),
+                             borderMode=cv2.BORDER_REFLECT)
+    noisy = shifted.astype(np.float32) * rng.uniform(0.85, 1.15) + rng.normal(0, 8, face.shape)
+    return preprocess(np.clip(noisy, 0, 255).astype(np.uint8))
+
+def load_faces(directory, limit):
+    faces = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(directory, name))
+            if image is not None:
+                faces.append(preprocess(image))
+        if len(faces) >= limit:
+            break
+    return faces
+
+def time_engine(engine, pairs, repeat):
+    references = [engine.prepare_reference(ref) for _, ref in pairs]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for (face, _), reference in zip(pairs, references):
+            engine.score(face, reference)
+    return (time.perf_counter() - start) / (repeat * len(pairs)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='data/face_samples', help='directory of face images')
+    parser.add_argument('--limit', type=int, default=200, help='maximum number of images to load')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions')
+    args = parser.parse_args()
+
+    faces = load_faces(args.images, args.limit)
+    if len(faces) < 2:
+        print(f"Need at least 2 images in {args.images}")
+        return
+
+    rng = np.random.default_rng(0)
+    same_pairs = [(perturb(face, rng), face) for face in faces]
+    diff_pairs = [(faces[i], faces[(i + 1) % len(faces)]) for i in range(len(faces))]
+    pairs = same_pairs + diff_pairs
+
+    ssim_engine = create_difference_engine('ssim')
+    fast_engine = create_difference_engine('fast')
+
+    exact = np.array([ssim_engine.score(f, ssim_engine.prepare_reference(r)) for f, r in pairs])
+    fast = np.array([fast_engine.score(f, fast_engine.prepare_reference(r)) for f, r in pairs])
+
+    # Sanity check the exact engine against skimage itself
+    skimage_ssim = np.array([ssim(f, r) for f, r in pairs[:20]])
+    skimage_l2 = np.array([min(100, np.linalg.norm(f.astype(float) - r.astype(float)) / MAX_L2 * 100)
+                           for f, r in pairs[:20]])
+    print(f"Images: {len(faces)}  pairs: {len(pairs)} ({len(same_pairs)} same, {len(diff_pairs)} different)")
+    print(f"'ssim' engine vs skimage: max |dSSIM| {np.abs(exact[:20, 1] - skimage_ssim).max():.2e}, "
+          f"max |dDiff| {np.abs(exact[:20, 0] - skimage_l2).max():.2e}")
+
+    for column, label in ((0, 'difference score'), (1, 'SSIM')):
+        error = fast[:, column] - exact[:, column]
+        corr = np.corrcoef(fast[:, column], exact[:, column])[0, 1]
+        print(f"{label:>16}: mean |error| {np.abs(error).mean():.3f}, max |error| {np.abs(error).max():.3f}, "
+              f"bias {error.mean():+.3f}, correlation {corr:.4f}")
+
+    agree = np.mean((fast[:, 0] < DIFFERENCE_THRESHOLD) == (exact[:, 0] < DIFFERENCE_THRESHOLD))
+    print(f"Decision agreement (difference < {DIFFERENCE_THRESHOLD}): {agree * 100:.1f}%")
+
+    ssim_ms = time_engine(ssim_engine, pairs, args.repeat)
+    fast_ms = time_engine(fast_engine, pairs, args.repeat)
+    start = time.perf_counter()
+    for f, r in pairs:
+        ssim(f, r)
+        np.linalg.norm(f.astype(float) - r.astype(float))
+    skimage_ms = (time.perf_counter() - start) / len(pairs) * 1000
+    print(f"Latency per comparison: skimage {skimage_ms:.3f} ms, 'ssim' {ssim_ms:.3f} ms, "
+          f"'fast' {fast_ms:.3f} ms ({skimage_ms / fast_ms:.1f}x faster than skimage)")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import cv2
 from src.utils.camera_controls import CameraControls
 from src.utils.ui_feedback import UIFeedback
 from src.utils.detection import FaceDetector
+from src.utils.tracking import DetectionScheduler
 
 class DetectionApp:
     def __init__(self):
@@ -43,6 +44,7 @@ class DetectionApp:
             # Initialize camera and detector
             camera = CameraControls()
             detector = FaceDetector()
+            scheduler = DetectionScheduler(detector.detect_faces)
             
             def on_capture(filename, image_bytes):
                 """Handle photo capture"""
@@ -65,7 +67,7 @@ class DetectionApp:
                     frame = camera.read_frame()
                     if frame is not None:
                         # Detect faces
-                        faces = detector.detect_faces(frame)
+                        faces = detector.describe(frame, scheduler.update(frame), recognize=True)
                         
                         # Draw detection results
                         frame = detector.draw_faces(frame, faces)
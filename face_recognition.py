@@ -1,27 +1,118 @@
 import cv2
 import os
+import json
+import time
+import signal
+import hashlib
+import threading
 import numpy as np
 from datetime import datetime
 from collections import deque
-from skimage.metrics import structural_similarity as ssim
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from src.database.db_operations import DatabaseOperations
 from src.utils.camera_controls import CameraControls
+from src.utils.difference import create_difference_engine
+from src.utils.detectors import DetectionTuner, create_detector_backend
+from src.utils.tracking import FaceTracker, DetectionScheduler
+from src.utils.motion import MotionGate
+from src.utils.pipeline import Pipeline
+from src.utils.events import EventPolicy
+
+# Preprocessed face samples (raw 256x256 uint8 rows) and their labels,
+# reused at startup while the face samples are unchanged
+MODEL_DIR = "data/models"
+MODEL_FACES_PATH = os.path.join(MODEL_DIR, "lbph_faces.u8")
+MODEL_META_PATH = os.path.join(MODEL_DIR, "lbph_model.json")
+MODEL_VERSION = 2
+FACE_SIZE = 256
+FACE_BYTES = FACE_SIZE * FACE_SIZE
+
+@dataclass
+class RecognitionResult:
+    """Recognition outcome for one face box in a frame"""
+    box: tuple
+    user_id: int = None
+    name: str = "unknown"
+    confidence: float = 0
+    difference: float = 100
+    face_img: np.ndarray = None  # Copy of the face crop, unaffected by drawing
+    track_id: int = None
 
 class FaceRecognitionSystem:
-    def __init__(self):
+    def __init__(self, training_workers=None, training_chunk_size=128, shard_size=1024,
+                 difference_engine="fast", detector_backend=None, detection_scale=1.0, min_face_size=30):
         self.db = DatabaseOperations()
+        # Training threads (defaults to all cores) and samples decoded per
+        # batch. Shards of shard_size samples train in parallel; the shard
+        # count depends only on the number of samples, as every shard adds
+        # a histogram pass to each predict
+        self.training_workers = training_workers or os.cpu_count() or 1
+        self.training_chunk_size = training_chunk_size
+        self.shard_size = shard_size
+        # LBPH models over disjoint parts of the samples; a face's match is
+        # the nearest one over all shards, as in a single model. Predictions
+        # read the tuple without locking, so shards are never updated in
+        # place: a background thread retrains a shard of recently enrolled
+        # samples and publishes it by replacing the tuple. Once it holds
+        # recent_shard_size samples they are merged into the base shards
+        self.recognizers = ()
+        self.base_shards = ()     # (first sample row, recognizer) per base shard
+        self.base_rows = 0        # Sample rows covered by the base shards
+        self.recent_shard_size = 64
+        self.recent_faces = []    # Samples enrolled since, rows base_rows onwards
+        self.recent_labels = []
+        self.recent_recognizer = None
+        self.enroll_thread = None
+        self.enroll_pending = False
+        self.model_generation = 0  # Bumped by retraining, discards stale background work
+        self.known_names = {}
+        self.samples_per_user = {}
+        self.user_labels = {}  # user_id -> recognizer label
+        self.label_user_ids = {}  # recognizer label -> user_id
+        # Preprocessed first sample of each label and its precomputed
+        # statistics, used for the difference score without DB or disk access.
+        # "fast" scores at reduced resolution, "ssim" reproduces skimage's SSIM
+        self.difference_engine = create_difference_engine(difference_engine)
+        self.reference_faces = {}
+        self.reference_stats = {}
+        self.is_trained = False
+        self.model_dirty = False  # Live model has updates not yet saved
+        # Serializes enrollment and retraining, which replace the recognizer
+        # and label maps; predictions only read them and do not take it
+        self.model_lock = threading.RLock()
+        self.enrolled = threading.Condition(self.model_lock)
+        # Serializes writes to the model cache, which happen outside model_lock
+        self.save_lock = threading.Lock()
+        self.cached_labels = []   # Label of each row in MODEL_FACES_PATH, -1 if unreadable
+        self.pending_faces = []   # Enrolled since the last save, not in the cache yet
+        self.pending_labels = []
+        self.current_place_id = 1
+        # Capture profile of the camera run() opens (name, dict or CaptureProfile)
+        self.capture_profile = None
+        # Face detector for each camera, selected by name or FACE_DETECTOR_BACKEND.
+        # It detects on frames downscaled by detection_scale, looking for
+        # faces of at least min_face_size full-resolution pixels
+        self.detector_options = {"scale": detection_scale, "min_face_size": min_face_size}
+        self.detector_name = detector_backend
+        # Serializes writes to the shared DB session from camera threads
+        self.db_lock = threading.Lock()
+        self.recognition_history = deque(maxlen=10)  # Store last 10 recognitions for smoothing
+        self.face_buffers = threading.local()  # Reused per-thread batch of preprocessed faces
+        self.load_known_faces()
+        # Fold new enrollments into the live model, retrain on deletions
+        DatabaseOperations.subscribe('face_sample_added', self._on_face_sample_added)
+        DatabaseOperations.subscribe('face_sample_deleted', self._on_face_sample_deleted)
+
+    def create_recognizer(self):
+        """Create an untrained LBPH face recognizer"""
         # Initialize LBPH face recognizer with optimized parameters
-        self.face_recognizer = cv2.face.LBPHFaceRecognizer_create(
+        return cv2.face.LBPHFaceRecognizer_create(
             radius=2,
             neighbors=12,
             grid_x=10,
             grid_y=10
         )
-        self.known_names = {}
-        self.samples_per_user = {}
-        self.current_place_id = 1
-        self.recognition_history = deque(maxlen=10)  # Store last 10 recognitions for smoothing
-        self.load_known_faces()
 
     def preprocess_face(self, face_img):
         """Preprocess face image for better recognition"""
@@ -43,35 +134,367 @@ class FaceRecognitionSystem:
             print(f"Error preprocessing face: {e}")
             return None
 
-    def load_known_faces(self):
-        """Load and train face recognizer with known face samples"""
-        users = self.db.get_all_users()
-        faces = []
-        labels = []
-        label_names = {}
-        samples_count = {}
-        
-        for idx, user in enumerate(users):
-            face_samples = self.db.get_user_face_samples(user.id)
-            label_names[idx] = user.name
-            samples_count[idx] = 0
-            
-            for sample in face_samples:
-                if os.path.exists(sample.image_path):
-                    image = cv2.imread(sample.image_path)
-                    if image is not None:
-                        # Preprocess face sample
-                        processed_face = self.preprocess_face(image)
-                        if processed_face is not None:
-                            faces.append(processed_face)
-                            labels.append(idx)
-                            samples_count[idx] += 1
-        
-        if faces:  # Only train if we have samples
-            self.face_recognizer.train(faces, np.array(labels))
+    def load_known_faces(self, use_cache=True):
+        """Load and train face recognizer with known face samples
+
+        Samples are preprocessed into the MODEL_FACES_PATH cache as they are
+        decoded. While the samples are unchanged the recognizer is retrained
+        from those rows without reading or preprocessing any image (LBPH's
+        own model file stores its histograms as text and loads slower than
+        a retrain).
+        """
+        fingerprint = self.compute_fingerprint()
+        cache = self.load_model(fingerprint) if use_cache else None
+        if cache is not None:
+            cached_faces, meta = cache
+            label_names = {int(k): v for k, v in meta["known_names"].items()}
+            user_labels = {int(k): v for k, v in meta["user_labels"].items()}
+            row_labels = list(meta["labels"])
+            load_face = lambda row: np.array(cached_faces[row]) if row_labels[row] >= 0 else None
+        else:
+            users = self.db.get_all_users()
+            label_names = {}
+            user_labels = {}
+            for idx, user in enumerate(users):
+                label_names[idx] = user.name
+                user_labels[user.id] = idx
+
+            # Samples are ordered by user and sample ID, so labels are fed to
+            # the recognizer in the same order on every run
+            samples = [(sample.image_path, user_labels[sample.user_id])
+                       for sample in self.db.get_all_face_samples()
+                       if sample.user_id in user_labels]
+            row_labels = [label for _, label in samples]
+            load_face = lambda row: self._load_training_face(samples[row][0])
+
+        start_time = time.time()
+        rows = len(row_labels)
+        with self.save_lock, ThreadPoolExecutor(max_workers=self.training_workers) as decode_pool, \
+                ThreadPoolExecutor(max_workers=self.training_workers) as shard_pool:
+            # Rows of the new cache, written as samples are decoded
+            cache_rows = None
+            tmp_faces_path = MODEL_FACES_PATH + ".tmp"
+            if cache is None and rows:
+                os.makedirs(MODEL_DIR, exist_ok=True)
+                cache_rows = np.memmap(tmp_faces_path, dtype=np.uint8, mode="w+",
+                                       shape=(rows, FACE_SIZE, FACE_SIZE))
+
+            # Shards extract their LBPH histograms in parallel, samples are
+            # decoded in parallel within each shard
+            shards = list(shard_pool.map(
+                lambda shard_rows: self._train_shard(shard_rows, load_face, row_labels, decode_pool, cache_rows),
+                [range(i, min(i + self.shard_size, rows)) for i in range(0, rows, self.shard_size)]))
+
+            if cache_rows is not None:
+                cache_rows.flush()
+                del cache_rows
+                os.replace(tmp_faces_path, MODEL_FACES_PATH)
+                self._write_model_meta(fingerprint, label_names, user_labels, row_labels)
+
+        base_shards = tuple((start, recognizer) for start, (recognizer, _) in zip(range(0, rows, self.shard_size), shards)
+                            if recognizer is not None)
+        references = {}
+        for _, shard_references in shards:
+            for label, face in shard_references.items():
+                references.setdefault(label, face)
+        samples_count = {label: 0 for label in label_names}
+        for label in row_labels:
+            if label >= 0:
+                samples_count[label] += 1
+        total_faces = sum(samples_count.values())
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        if total_faces:
+            source = "cached faces" if cache is not None else "faces"
+            print(f"Trained recognizer with {total_faces} {source} from {len(label_names)} users "
+                  f"in {elapsed:.1f}s ({total_faces / elapsed:.0f} samples/s, "
+                  f"{len(base_shards)} shards, {self.training_workers} workers)")
+
+        with self.model_lock:
+            self.model_generation += 1
+            self.base_shards = base_shards
+            self.base_rows = rows
+            self.recent_faces = []
+            self.recent_labels = []
+            self.recent_recognizer = None
+            self.enroll_pending = False
+            self._publish_shards()
+            self.is_trained = total_faces > 0
             self.known_names = label_names
             self.samples_per_user = samples_count
-            print(f"Trained recognizer with {len(faces)} faces from {len(self.known_names)} users")
+            self.user_labels = user_labels
+            self.label_user_ids = {label: user_id for user_id, label in user_labels.items()}
+            self.set_reference_faces(references)
+            self.cached_labels = row_labels
+            self.pending_faces = []
+            self.pending_labels = []
+            self.model_dirty = False
+
+    def _train_shard(self, rows, load_face, row_labels, decode_pool, cache_rows=None):
+        """Train one LBPH shard over rows of the samples (runs in a worker thread)
+
+        Samples are decoded on decode_pool, a chunk ahead of training.
+        Unreadable rows get label -1; decoded faces are copied to cache_rows.
+        Returns (recognizer, {label: first face}), recognizer None if no face
+        could be read.
+        """
+        recognizer = None
+        references = {}
+        chunks = [range(start, min(start + self.training_chunk_size, rows.stop))
+                  for start in range(rows.start, rows.stop, self.training_chunk_size)]
+        decoded = decode_pool.map(load_face, chunks[0]) if chunks else None
+        for i, chunk_rows in enumerate(chunks):
+            chunk_faces = decoded
+            if i + 1 < len(chunks):
+                decoded = decode_pool.map(load_face, chunks[i + 1])
+            faces = []
+            labels = []
+            for row, processed_face in zip(chunk_rows, chunk_faces):
+                if processed_face is None:
+                    row_labels[row] = -1
+                    continue
+                label = row_labels[row]
+                faces.append(processed_face)
+                labels.append(label)
+                references.setdefault(label, processed_face)
+                if cache_rows is not None:
+                    cache_rows[row] = processed_face
+            if faces:
+                # update() on an untrained model is equivalent to train()
+                if recognizer is None:
+                    recognizer = self.create_recognizer()
+                recognizer.update(faces, np.array(labels))
+        return recognizer, references
+
+    def set_reference_faces(self, references):
+        """Replace the per-label reference cache"""
+        with self.model_lock:
+            self.reference_faces = dict(references)
+            self.reference_stats = {
+                label: self.difference_engine.prepare_reference(face)
+                for label, face in self.reference_faces.items()
+            }
+
+    def _load_training_face(self, image_path):
+        """Read and preprocess one training sample (runs in a worker thread)"""
+        if not os.path.exists(image_path):
+            return None
+        image = cv2.imread(image_path)
+        if image is None:
+            return None
+        return self.preprocess_face(image)
+
+    def compute_fingerprint(self):
+        """Hash the users, face_samples rows and sample file stats"""
+        digest = hashlib.sha256(f"v{MODEL_VERSION}".encode())
+        for user in self.db.get_all_users():
+            digest.update(f"u|{user.id}|{user.name}\n".encode())
+        for sample in self.db.get_all_face_samples():
+            try:
+                stat = os.stat(sample.image_path)
+                file_info = f"{stat.st_mtime_ns}|{stat.st_size}"
+            except OSError:
+                file_info = "missing"
+            digest.update(f"s|{sample.id}|{sample.user_id}|{sample.image_path}|{file_info}\n".encode())
+        return digest.hexdigest()
+
+    def save_model(self, fingerprint=None):
+        """Append the samples enrolled since the last save to the model cache
+
+        What needs saving is copied under model_lock and written outside
+        it, so recognition is not held up by the disk.
+        """
+        if fingerprint is None:
+            fingerprint = self.compute_fingerprint()
+        with self.save_lock:
+            with self.model_lock:
+                if not self.is_trained:
+                    return False
+                faces = list(self.pending_faces)
+                start = len(self.cached_labels)
+                labels = self.cached_labels + self.pending_labels
+                known_names = dict(self.known_names)
+                user_labels = dict(self.user_labels)
+            try:
+                os.makedirs(MODEL_DIR, exist_ok=True)
+                # Rows past the cached ones are left over from an interrupted save
+                with open(MODEL_FACES_PATH, "r+b" if os.path.exists(MODEL_FACES_PATH) else "wb") as f:
+                    f.seek(start * FACE_BYTES)
+                    for face in faces:
+                        f.write(face.tobytes())
+                    f.truncate()
+                self._write_model_meta(fingerprint, known_names, user_labels, labels)
+            except Exception as e:
+                print(f"Error saving model cache: {e}")
+                return False
+            with self.model_lock:
+                del self.pending_faces[:len(faces)]
+                del self.pending_labels[:len(faces)]
+                self.cached_labels = labels
+                self.model_dirty = bool(self.pending_faces)
+            return True
+
+    def _write_model_meta(self, fingerprint, known_names, user_labels, labels):
+        """Replace the model cache metadata, which validates the face rows"""
+        meta = {
+            "version": MODEL_VERSION,
+            "fingerprint": fingerprint,
+            "known_names": known_names,
+            "user_labels": user_labels,
+            "labels": labels,
+        }
+        tmp_meta_path = MODEL_META_PATH + ".tmp"
+        with open(tmp_meta_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta_path, MODEL_META_PATH)
+
+    def load_model(self, fingerprint):
+        """Return (faces, meta) of the model cache if it was built from the same samples
+
+        faces is a read-only memmap with the preprocessed face of each row
+        in meta["labels"].
+        """
+        if not all(os.path.exists(path) for path in (MODEL_FACES_PATH, MODEL_META_PATH)):
+            return None
+        try:
+            with open(MODEL_META_PATH) as f:
+                meta = json.load(f)
+            if meta.get("version") != MODEL_VERSION or meta.get("fingerprint") != fingerprint:
+                return None
+            rows = len(meta["labels"])
+            if not rows:
+                return None
+            faces = np.memmap(MODEL_FACES_PATH, dtype=np.uint8, mode="r", shape=(rows, FACE_SIZE, FACE_SIZE))
+            return faces, meta
+        except Exception as e:
+            print(f"Error loading model cache: {e}")
+            return None
+
+    def add_face_sample(self, user_id, image_path):
+        """Fold a newly enrolled face sample into the live model"""
+        image = cv2.imread(image_path) if os.path.exists(image_path) else None
+        if image is None:
+            return False
+        processed_face = self.preprocess_face(image)
+        if processed_face is None:
+            return False
+
+        with self.model_lock:
+            label = self.user_labels.get(user_id)
+            if label is None:
+                user = self.db.get_user(user_id)
+                if user is None:
+                    return False
+                label = max(self.known_names, default=-1) + 1
+                self.user_labels[user_id] = label
+                self.label_user_ids[label] = user_id
+                self.known_names[label] = user.name
+                self.samples_per_user[label] = 0
+
+            self.pending_faces.append(processed_face)
+            self.pending_labels.append(label)
+            self.samples_per_user[label] += 1
+            if label not in self.reference_faces:
+                self.reference_faces = {**self.reference_faces, label: processed_face}
+                self.reference_stats = {**self.reference_stats,
+                                        label: self.difference_engine.prepare_reference(processed_face)}
+            self.recent_faces.append(processed_face)
+            self.recent_labels.append(label)
+            self.is_trained = True
+            self.model_dirty = True
+
+            # Training takes longer the more samples the recent shard holds,
+            # so it happens on a background thread rather than the caller's
+            self.enroll_pending = True
+            if self.enroll_thread is None:
+                self.enroll_thread = threading.Thread(target=self._enroll_loop, daemon=True)
+                self.enroll_thread.start()
+        return True
+
+    def wait_for_enrollment(self, timeout=None):
+        """Wait until samples enrolled so far are recognized; returns False on timeout"""
+        with self.enrolled:
+            return self.enrolled.wait_for(lambda: self.enroll_thread is None, timeout)
+
+    def _enroll_loop(self):
+        """Retrain the recent shard until no enrollment is waiting (runs in a background thread)
+
+        A full recent shard is merged into the last base shard, or becomes a
+        new base shard if that would exceed shard_size, so the number of
+        shards grows with the samples as it would after a restart.
+        """
+        while True:
+            with self.model_lock:
+                if not self.enroll_pending:
+                    self.enroll_thread = None
+                    self.enrolled.notify_all()
+                    return
+                self.enroll_pending = False
+                generation = self.model_generation
+                recent_faces = list(self.recent_faces)
+                recent_labels = list(self.recent_labels)
+                merge = len(recent_faces) >= self.recent_shard_size
+                extend = (merge and self.base_shards
+                          and self.base_rows + len(recent_faces) - self.base_shards[-1][0] <= self.shard_size)
+                start = self.base_shards[-1][0] if extend else self.base_rows
+                base_rows = self.base_rows
+                cached_rows = len(self.cached_labels)
+                row_labels = self.cached_labels + self.pending_labels
+                pending_faces = list(self.pending_faces)
+
+            try:
+                faces = []
+                labels = []
+                if start < base_rows:
+                    # Samples of the last base shard, from the model cache or
+                    # still waiting to be saved
+                    cached_faces = None
+                    if start < cached_rows:
+                        cached_faces = np.memmap(MODEL_FACES_PATH, dtype=np.uint8, mode="r",
+                                                 shape=(cached_rows, FACE_SIZE, FACE_SIZE))
+                    for row in range(start, base_rows):
+                        if row_labels[row] < 0:
+                            continue
+                        faces.append(np.array(cached_faces[row]) if row < cached_rows
+                                     else pending_faces[row - cached_rows])
+                        labels.append(row_labels[row])
+                recognizer = self.create_recognizer()
+                recognizer.train(faces + recent_faces, np.array(labels + recent_labels))
+            except Exception as e:
+                print(f"Error updating recognizer with new samples: {e}")
+                continue
+
+            with self.model_lock:
+                if generation != self.model_generation:
+                    continue
+                if not merge:
+                    self.recent_recognizer = recognizer
+                else:
+                    base_shards = self.base_shards[:-1] if extend else self.base_shards
+                    self.base_shards = base_shards + ((start, recognizer),)
+                    self.base_rows += len(recent_faces)
+                    del self.recent_faces[:len(recent_faces)]
+                    del self.recent_labels[:len(recent_faces)]
+                    if self.recent_faces:
+                        # The old recent shard covers some of the remaining
+                        # samples until it is rebuilt
+                        self.enroll_pending = True
+                    else:
+                        self.recent_recognizer = None
+                self._publish_shards()
+
+    def _publish_shards(self):
+        """Replace the recognizers predictions use (called with model_lock held)"""
+        recent = (self.recent_recognizer,) if self.recent_recognizer is not None else ()
+        self.recognizers = tuple(recognizer for _, recognizer in self.base_shards) + recent
+
+    def _on_face_sample_added(self, face_sample):
+        """Handle DatabaseOperations 'face_sample_added' notifications"""
+        self.add_face_sample(face_sample.user_id, face_sample.image_path)
+
+    def _on_face_sample_deleted(self, face_sample):
+        """LBPH cannot forget samples, so deletions need a full retrain"""
+        self.load_known_faces()
 
     def calculate_face_difference(self, face1, face2):
         """Calculate difference between two face images"""
@@ -85,17 +508,9 @@ class FaceRecognitionSystem:
         if face1_proc is None or face2_proc is None:
             return float('inf'), 0
             
-        # Calculate SSIM score
-        ssim_score = ssim(face1_proc, face2_proc)
-        
-        # Calculate L2 norm difference
-        l2_diff = np.linalg.norm(face1_proc.astype(float) - face2_proc.astype(float))
-        
-        # Normalize L2 difference to 0-100 scale
-        max_l2 = 100000  # Maximum expected L2 difference
-        normalized_diff = min(100, (l2_diff / max_l2) * 100)
-        
-        return normalized_diff, ssim_score
+        # SSIM score and L2 difference normalized to a 0-100 scale
+        reference = self.difference_engine.prepare_reference(face2_proc)
+        return self.difference_engine.score(face1_proc, reference)
 
     def calculate_confidence_score(self, distance):
         """Convert LBPH distance to a confidence percentage"""
@@ -113,118 +528,327 @@ class FaceRecognitionSystem:
         threshold = min(80, base_threshold + (samples * sample_factor))
         return threshold
 
-    def smooth_recognition(self, prediction):
-        """Apply temporal smoothing to recognition results"""
-        self.recognition_history.append(prediction)
+    def get_user_name(self, user_id):
+        """Get the name of a user known to the recognizer"""
+        label = self.user_labels.get(user_id)
+        return self.known_names.get(label, "unknown")
+
+    def smooth_recognition(self, prediction, history=None):
+        """Apply temporal smoothing to (user_id, score) recognition results
+
+        history is the deque to vote over, e.g. a Track's own history;
+        defaults to the shared recognition_history.
+        """
+        if history is None:
+            history = self.recognition_history
+        history.append(prediction)
         
-        if len(self.recognition_history) >= 5:  # Need at least 5 samples for smoothing
-            recent = list(self.recognition_history)
-            name_counts = {}
+        if len(history) >= 5:  # Need at least 5 samples for smoothing
+            recent = list(history)
+            id_counts = {}
             
-            # Count occurrences of each name
-            for n, _ in recent:
-                name_counts[n] = name_counts.get(n, 0) + 1
+            # Count occurrences of each user
+            for u, _ in recent:
+                id_counts[u] = id_counts.get(u, 0) + 1
             
-            # Find the most common name
-            max_count = max(name_counts.values())
-            most_common = [n for n, count in name_counts.items() if count == max_count]
+            # Find the most common user
+            max_count = max(id_counts.values())
+            most_common = [u for u, count in id_counts.items() if count == max_count]
             
-            # Return most common name if it appears more than 40% of the time
+            # Return most common user if it appears more than 40% of the time
             if max_count > len(recent) * 0.4:
-                # Get average confidence for the most common name
-                confidences = [conf for name, conf in recent if name == most_common[0]]
+                # Get average confidence for the most common user
+                confidences = [conf for user_id, conf in recent if user_id == most_common[0]]
                 avg_confidence = sum(confidences) / len(confidences)
                 return most_common[0], avg_confidence
         
         return prediction
 
     def recognize_face(self, face_img):
-        """Recognize a face using enhanced recognition process"""
+        """Recognize a face, returning (user_id, name, confidence, difference)
+
+        user_id is None and name is "unknown" when no user matches.
+        """
         # Preprocess the face
         processed_face = self.preprocess_face(face_img)
         if processed_face is None:
-            return "unknown", 0, 100  # High difference indicates poor match
-        
+            return None, "unknown", 0, 100  # High difference indicates poor match
+        return self._score_faces([processed_face])[0]
+
+    def recognize_faces(self, frame, boxes, histories=None):
+        """Recognize every face box in a frame in one batched pass
+
+        Returns one RecognitionResult per box, in the same order, for both
+        drawing and save_recognition_event to reuse. histories optionally
+        gives each box its own smoothing history.
+        """
+        results = [RecognitionResult(box=tuple(int(v) for v in box)) for box in boxes]
+        if not results:
+            return results
+
+        batch = self._face_batch(len(results))
+        valid = []
+        for i, result in enumerate(results):
+            x, y, w, h = result.box
+            result.face_img = frame[max(y, 0):y+h, max(x, 0):x+w].copy()
+            if self._preprocess_into(result.face_img, batch[i]):
+                valid.append(i)
+
+        scores = self._score_faces(batch if len(valid) == len(results) else batch[valid],
+                                   [histories[i] for i in valid] if histories is not None else None)
+        for i, (user_id, name, confidence, difference) in zip(valid, scores):
+            result = results[i]
+            result.user_id, result.name = user_id, name
+            result.confidence, result.difference = confidence, difference
+        return results
+
+    def _face_batch(self, n):
+        """Return a preallocated n x 256 x 256 buffer for preprocessed faces"""
+        buffer = getattr(self.face_buffers, "batch", None)
+        if buffer is None or len(buffer) < n:
+            buffer = self.face_buffers.batch = np.empty((max(n, 8), 256, 256), dtype=np.uint8)
+        return buffer[:n]
+
+    def _preprocess_into(self, face_img, out):
+        """preprocess_face writing into a preallocated 256x256 buffer"""
         try:
-            # Predict the label and get distance
-            label, distance = self.face_recognizer.predict(processed_face)
-            
-            # Convert distance to confidence score (0-100)
-            confidence = self.calculate_confidence_score(distance)
-            
-            # Get dynamic threshold based on number of samples
-            threshold = self.get_dynamic_threshold(label)
-            
-            # Get reference face for comparison
-            difference_score = 100  # Default high difference
-            reference_face = None
-            if label in self.known_names:
-                users = self.db.get_all_users()
-                for user in users:
-                    if user.name == self.known_names[label]:
-                        face_samples = self.db.get_user_face_samples(user.id)
-                        if face_samples:
-                            reference_face = cv2.imread(face_samples[0].image_path)
-                            break
-            
-            # Calculate face difference if reference face exists
-            if reference_face is not None:
-                difference_score, _ = self.calculate_face_difference(face_img, reference_face)
+            if face_img.size == 0:
+                return False
+            gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if len(face_img.shape) == 3 else face_img
+            cv2.resize(gray, (256, 256), dst=out)
+            cv2.equalizeHist(out, dst=out)
+            return True
+        except Exception as e:
+            print(f"Error preprocessing face: {e}")
+            return False
+
+    def recognize_tracks(self, frame, tracker, boxes):
+        """Recognize faces through a FaceTracker, re-running only due tracks
+
+        Each face keeps its track's last result and smoothing history; the
+        full recognizer only runs on new tracks and those whose result is
+        stale. Returns (tracks, results) for the faces visible in this frame.
+        """
+        tracks = tracker.update(boxes)
+        due = [track for track in tracks if tracker.needs_recognition(track)]
+        fresh = self.recognize_faces(frame, [track.box for track in due],
+                                     histories=[track.history for track in due])
+        for track, result in zip(due, fresh):
+            tracker.set_result(track, result)
+
+        results = []
+        for track in tracks:
+            x, y, w, h = track.box
+            previous = track.result
+            results.append(RecognitionResult(
+                box=track.box,
+                user_id=previous.user_id,
+                name=previous.name,
+                confidence=previous.confidence,
+                difference=previous.difference,
+                face_img=frame[max(y, 0):y+h, max(x, 0):x+w].copy(),
+                track_id=track.track_id,
+            ))
+        return tracks, results
+
+    def _score_faces(self, processed_faces, histories=None):
+        """Score preprocessed faces, returning (user_id, name, confidence, difference) each"""
+        results = [(None, "unknown", 0, 100)] * len(processed_faces)  # High difference for errors
+        try:
+            # Predict the label and get distance. Enrollment replaces the
+            # shards and reference statistics rather than changing them, so
+            # a snapshot is safe to use without the lock and cameras predict
+            # concurrently (cv2 releases the GIL)
+            recognizers = self.recognizers
+            reference_stats = self.reference_stats
+            if not recognizers:
+                return results
+            predictions = [min((recognizer.predict(face) for recognizer in recognizers),
+                               key=lambda prediction: prediction[1])
+                           for face in processed_faces]
             
-            # Combined decision using both confidence and difference
-            combined_score = 0.6 * confidence + 0.4 * (100 - difference_score)
+            # Compare against the cached reference face of each predicted label
+            with_reference = [i for i, (label, _) in enumerate(predictions) if label in reference_stats]
+            differences = dict(zip(with_reference, self.difference_engine.score_batch(
+                [processed_faces[i] for i in with_reference],
+                [reference_stats[predictions[i][0]] for i in with_reference],
+            )))
             
-            # Check if prediction meets thresholds
-            if combined_score > threshold and difference_score < 70:  # Allow some difference
-                name = self.known_names.get(label, "unknown")
-                # Apply temporal smoothing with combined score
-                smoothed_name, smoothed_score = self.smooth_recognition((name, combined_score))
-                return smoothed_name, smoothed_score, difference_score
-            else:
-                return "unknown", confidence, difference_score
+            # Filled in full before replacing the defaults, so an error leaves
+            # one result per face
+            scored = []
+            for i, (label, distance) in enumerate(predictions):
+                # Convert distance to confidence score (0-100)
+                confidence = self.calculate_confidence_score(distance)
+                
+                # Get dynamic threshold based on number of samples
+                threshold = self.get_dynamic_threshold(label)
+                
+                difference_score = differences.get(i, (100, 0))[0]  # Default high difference
+                
+                # Combined decision using both confidence and difference
+                combined_score = 0.6 * confidence + 0.4 * (100 - difference_score)
+                
+                # Check if prediction meets thresholds
+                user_id = self.label_user_ids.get(label)
+                if user_id is not None and combined_score > threshold and difference_score < 70:  # Allow some difference
+                    # Apply temporal smoothing with combined score
+                    history = histories[i] if histories is not None else None
+                    smoothed_id, smoothed_score = self.smooth_recognition((user_id, combined_score), history)
+                    scored.append((smoothed_id, self.get_user_name(smoothed_id), smoothed_score, difference_score))
+                else:
+                    scored.append((None, "unknown", confidence, difference_score))
+            results = scored
                 
         except Exception as e:
             print(f"Error during face recognition: {e}")
-            return "unknown", 0, 100  # High difference for errors
+        return results
 
-    def save_recognition_event(self, name, face_img, confidence, difference):
-        """Save recognition event to database with confidence and difference scores"""
-        if name != "unknown":
-            # Find user ID by name
-            users = self.db.get_all_users()
-            user_id = None
-            for user in users:
-                if user.name == name:
-                    user_id = user.id
-                    break
+    def draw_results(self, frame, results):
+        """Draw boxes and labels for recognition results"""
+        for result in results:
+            x, y, w, h = result.box
             
-            if user_id:
-                # Save the face image
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                image_path = f"data/recognition_events/{name}_{timestamp}.jpg"
-                cv2.imwrite(image_path, face_img)
-                
-                # Create recognition event with confidence and difference scores
-                self.db.add_recognition_event(user_id, self.current_place_id, image_path, 
+            # Draw rectangle and name
+            color = (0, 255, 0) if result.user_id is not None else (0, 0, 255)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            
+            # Display name, confidence, and difference
+            display_text = f"{result.name} (Conf: {result.confidence:.1f}%, Diff: {result.difference:.1f}%)"
+            cv2.putText(frame, display_text, (x, y-10),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        return frame
+
+    def save_recognition_event(self, user_id, face_img, confidence, difference, place_id=None):
+        """Save recognition event to database with confidence and difference scores
+
+        place_id defaults to current_place_id.
+        """
+        if user_id is not None:
+            place_id = place_id if place_id is not None else self.current_place_id
+            # Save the face image
+            name = self.get_user_name(user_id)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            image_path = f"data/recognition_events/{name}_{user_id}_{place_id}_{timestamp}.jpg"
+            cv2.imwrite(image_path, face_img)
+            
+            # Create recognition event with confidence and difference scores
+            with self.db_lock:
+                self.db.add_recognition_event(user_id, place_id, image_path, 
                                            confidence_score=confidence, 
                                            difference_score=difference)
 
-    def run(self):
-        """Run the face recognition system"""
+    def create_place_detector(self, place_id):
+        """Create a detector backend configured for a place
+
+        Cascades are not safe to share between threads, so every camera gets
+        its own backend with the same options.
+        """
+        backend = create_detector_backend(self.detector_name, **self.detector_options)
+        with self.db_lock:
+            backend.apply_settings(self.db.get_place_detection_settings(place_id))
+        return backend
+
+    def create_pipeline(self, camera, place_id=None):
+        """Build the capture -> detect -> recognize pipeline for one camera
+
+        The pipeline is returned unstarted so callers can append stages.
+        Its items are (frame, results) with RecognitionResults per track.
+        """
+        place_id = place_id if place_id is not None else self.current_place_id
+        
+        # Run the detector every few frames and track the boxes in between,
+        # scanning only the face sizes and area seen so far
+        tuner = DetectionTuner(self.create_place_detector(place_id))
+        scheduler = DetectionScheduler(tuner.detect)
+        
+        # Follow faces across frames so each is recognized once per track
+        tracker = FaceTracker()
+        
+        # Skip detection entirely while nothing moves in front of the camera
+        motion = MotionGate()
+        
+        def detect_stage(frame):
+            # Detect or track faces; None marks frames without motion
+            if motion.update(frame):
+                return frame, scheduler.update(frame)
+            scheduler.reset()
+            return frame, None
+        
+        def recognize_stage(item):
+            # Recognize faces per track
+            frame, faces = item
+            results = []
+            if faces is not None:
+                _, results = self.recognize_tracks(frame, tracker, faces)
+                if results:
+                    motion.touch()
+            return frame, results
+        
+        # Capture, detection and recognition overlap in their own threads
+        pipeline = Pipeline()
+        pipeline.add_source("capture", camera.next_frame, wait=camera.wait_frame)
+        pipeline.add_stage("detect", detect_stage)
+        pipeline.add_stage("recognize", recognize_stage)
+        return pipeline
+
+    def create_recorder(self, policy, place_id=None):
+        """Pipeline stage saving the results an EventPolicy selects
+
+        Used where no one presses SPACE; items pass through unchanged.
+        """
+        place_id = place_id if place_id is not None else self.current_place_id
+        
+        def record_stage(item):
+            _, results = item
+            for result in policy.select(place_id, results):
+                self.save_recognition_event(result.user_id, result.face_img,
+                                            result.confidence, result.difference,
+                                            place_id=place_id)
+            return item
+        return record_stage
+
+    def run(self, headless=False, policy=None, stats_interval=60):
+        """Run the face recognition system
+
+        With headless no window is opened and nothing is drawn: events are
+        recorded as the policy (an EventPolicy) allows instead of on SPACE,
+        and SIGINT or SIGTERM stops the system.
+        """
         # Create directories if they don't exist
         os.makedirs("data/recognition_events", exist_ok=True)
         
-        # Initialize camera controls
-        camera = CameraControls()
+        # Initialize camera controls, reopening the camera that last worked here
+        camera = CameraControls(place_id=self.current_place_id, profile=self.capture_profile)
         camera.set_capture_callback(lambda filename, _: print(f"Photo captured: {filename}"))
         
         if not camera.start():
             print("Error: Could not start camera.")
             return
             
-        # Load the face detection cascade
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        # Detection and recognition run in pipeline threads restricted to
+        # this place's ROI; drawing, imshow and waitKey stay on this thread
+        pipeline = self.create_pipeline(camera)
+        if headless:
+            pipeline.add_stage("record", self.create_recorder(policy or EventPolicy()))
+        pipeline.start()
+        
+        if headless:
+            self._run_headless(camera, pipeline, stats_interval)
+        else:
+            self._run_preview(camera, pipeline)
         
+        pipeline.stop()
+        camera.stop()
+        print(f"\nCamera: {camera.format_capture()}, {camera.measured_fps():.1f} fps measured, "
+              f"{camera.frames_dropped} frames dropped")
+        print("Pipeline stages:")
+        print(pipeline.format_stats())
+        if self.model_dirty:
+            self.save_model()
+
+    def _run_preview(self, camera, pipeline):
+        """Show the results in a window until ESC, saving events on SPACE"""
         # Set window properties
         cv2.namedWindow("Face Recognition System", cv2.WINDOW_NORMAL)
         
@@ -234,41 +858,22 @@ class FaceRecognitionSystem:
         print("R: Reset/Retake")
         print("ESC: Exit")
         
+        results = []
         while camera.is_running:
-            frame = camera.read_frame()
-            if frame is None:
-                continue
-                
-            # Convert frame to grayscale for detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
-            
-            # Process detected faces
-            detected_someone = False
-            for (x, y, w, h) in faces:
-                detected_someone = True
-                # Extract face region
-                face_img = frame[y:y+h, x:x+w]
+            item = pipeline.get(timeout=0.05)
+            if item is not None:
+                # Draw the results of the newest processed frame
+                frame, results = item
+                self.draw_results(frame, results)
                 
-                # Recognize face
-                name, confidence, difference = self.recognize_face(face_img)
+                # Show capture hint if face detected
+                if results:
+                    cv2.putText(frame, "Press SPACE to capture", (10, frame.shape[0] - 20),
+                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
                 
-                # Draw rectangle and name
-                color = (0, 255, 0) if name != "unknown" else (0, 0, 255)
-                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                
-                # Display name, confidence, and difference
-                display_text = f"{name} (Conf: {confidence:.1f}%, Diff: {difference:.1f}%)"
-                cv2.putText(frame, display_text, (x, y-10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-            
-            # Show capture hint if face detected
-            if detected_someone:
-                cv2.putText(frame, "Press SPACE to capture", (10, frame.shape[0] - 20),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            # Display the frame
-            camera.show_preview(frame)
+                # Display the frame
+                camera.show_preview(frame)
+            detected_someone = bool(results)
             
             # Handle keyboard input
             key = cv2.waitKey(1) & 0xFF
@@ -277,12 +882,29 @@ class FaceRecognitionSystem:
                 
             # Handle photo capture
             if key == ord(' ') and detected_someone:
-                for (x, y, w, h) in faces:
-                    face_img = frame[y:y+h, x:x+w]
-                    name, confidence, difference = self.recognize_face(face_img)
-                    self.save_recognition_event(name, face_img, confidence, difference)
+                for result in results:
+                    self.save_recognition_event(result.user_id, result.face_img,
+                                                result.confidence, result.difference)
+
+    def _run_headless(self, camera, pipeline, stats_interval):
+        """Wait for SIGINT/SIGTERM while the pipeline records events"""
+        stopping = threading.Event()
         
-        camera.stop()
+        def request_stop(signum, _):
+            print(f"\nReceived {signal.Signals(signum).name}, shutting down...")
+            stopping.set()
+        
+        previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        print("Running headless; send SIGINT or SIGTERM to stop")
+        try:
+            last_stats = time.monotonic()
+            while camera.is_running and not stopping.wait(1.0):
+                if time.monotonic() - last_stats >= stats_interval:
+                    print(pipeline.format_stats())
+                    last_stats = time.monotonic()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
 
 def main():
     face_system = FaceRecognitionSystem()
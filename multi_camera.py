@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import signal
+import argparse
+import traceback
+import cv2
+from face_recognition import FaceRecognitionSystem
+from src.utils.sources import create_frame_source
+from src.utils.events import EventPolicy
+
+CAMERA_CONFIG_PATH = "data/cameras.json"
+
+def load_camera_config(path=CAMERA_CONFIG_PATH):
+    """Read the [{"place_id": ..., "source": ..., "profile": ...}, ...] camera list
+
+    profile is optional: a capture profile name or its settings.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+class CameraStream:
+    """One camera and its recognition pipeline, bound to a place
+
+    Recorded footage is replayed at its own frame rate, like a camera.
+    """
+
+    def __init__(self, place, source, profile=None):
+        self.place = place
+        self.source = source
+        self.camera = create_frame_source(source, realtime=True, profile=profile)
+        self.pipeline = None
+
+class MultiCameraHost:
+    """Runs one recognition pipeline per place against a shared recognizer
+
+    All cameras share a single FaceRecognitionSystem, so the LBPH model,
+    reference faces and DB session are loaded once. Every camera has its
+    own detector, tracker and pipeline threads, and events are saved with
+    the camera's place_id when the EventPolicy allows it.
+    """
+
+    def __init__(self, cameras, face_system=None, policy=None, preview=False, stats_interval=60,
+                 profile=None):
+        self.face_system = face_system or FaceRecognitionSystem()
+        self.policy = policy or EventPolicy()
+        self.preview = preview
+        self.stats_interval = stats_interval
+        self.cameras = cameras
+        self.profile = profile  # Capture profile of cameras without their own
+        self.streams = []
+        self.running = False
+
+    def start(self):
+        """Open every camera and start its pipeline; returns the number started"""
+        # OpenCV parallelizes internally too; split the cores between cameras
+        # so the camera threads do not oversubscribe them
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // max(1, len(self.cameras))))
+
+        for camera_config in self.cameras:
+            place_id = camera_config["place_id"]
+            place = self.face_system.db.get_place(place_id)
+            if place is None:
+                print(f"Error: place {place_id} does not exist, skipping its camera")
+                continue
+
+            stream = CameraStream(place, camera_config["source"],
+                                  camera_config.get("profile", self.profile))
+            if not stream.camera.start():
+                print(f"Error: could not open camera {stream.source} for {place.name}")
+                continue
+
+            stream.pipeline = self.face_system.create_pipeline(stream.camera, place.id)
+            stream.pipeline.add_stage("record", self.face_system.create_recorder(self.policy, place.id))
+            stream.pipeline.start()
+            self.streams.append(stream)
+            print(f"Camera {stream.source} running for {place.name} (place {place.id}), "
+                  f"{stream.camera.format_capture()}")
+
+        self.running = bool(self.streams)
+        return len(self.streams)
+
+    def run(self):
+        """Start the cameras and process until stopped or interrupted"""
+        if not self.start():
+            print("Error: no camera could be started.")
+            return
+
+        # Services are stopped with SIGTERM; shut down as on Ctrl+C
+        previous = signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'running', False))
+        last_stats = time.monotonic()
+        try:
+            while self.running and any(stream.camera.is_running for stream in self.streams):
+                if self.preview:
+                    self._show_previews()
+                else:
+                    time.sleep(0.2)
+
+                if time.monotonic() - last_stats >= self.stats_interval:
+                    self.print_stats()
+                    last_stats = time.monotonic()
+        except KeyboardInterrupt:
+            print("\nShutting down gracefully...")
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            self.stop()
+
+    def stop(self):
+        """Stop every pipeline and camera"""
+        self.running = False
+        for stream in self.streams:
+            stream.pipeline.stop()
+            stream.camera.stop()
+        self.print_stats()
+        if self.face_system.model_dirty:
+            self.face_system.save_model()
+
+    def print_stats(self):
+        """Print the per-stage throughput of every camera"""
+        for stream in self.streams:
+            print(f"\n{stream.place.name} (place {stream.place.id}), {stream.camera.format_capture()}, "
+                  f"{stream.camera.measured_fps():.1f} fps measured, "
+                  f"{stream.camera.frames_dropped} camera frames dropped:")
+            print(stream.pipeline.format_stats())
+
+    def _show_previews(self):
+        """Show the newest frame of every camera; imshow must stay on this thread"""
+        for stream in self.streams:
+            item = stream.pipeline.get(timeout=0.01)
+            if item is not None:
+                frame, results = item
+                self.face_system.draw_results(frame, results)
+                cv2.imshow(f"{stream.place.name} (place {stream.place.id})", frame)
+        if cv2.waitKey(1) & 0xFF == 27:  # ESC
+            self.running = False
+
+def main():
+    parser = argparse.ArgumentParser(description="Run face recognition on several cameras, one per place")
+    parser.add_argument('--config', default=CAMERA_CONFIG_PATH,
+                        help='JSON list of {"place_id": ..., "source": ...} cameras')
+    parser.add_argument('--camera', action='append', default=[], metavar='PLACE_ID=SOURCE',
+                        help='camera for a place, e.g. 1=0, 2=rtsp://host/stream or 3=recording.mp4 (repeatable)')
+    parser.add_argument('--cooldown', type=float, default=60, help='seconds before the same user is recorded again')
+    parser.add_argument('--min-confidence', type=float, default=0, help='minimum confidence to record an event')
+    parser.add_argument('--preview', action='store_true', help='show a window per camera')
+    parser.add_argument('--profile', help='capture profile of cameras without one, e.g. 720p')
+    args = parser.parse_args()
+
+    cameras = load_camera_config(args.config)
+    for camera in args.camera:
+        place_id, source = camera.split('=', 1)
+        cameras.append({"place_id": int(place_id), "source": source})
+    if not cameras:
+        print(f"No cameras configured; add them to {args.config} or pass --camera PLACE_ID=SOURCE")
+        return
+
+    try:
+        os.makedirs("data/recognition_events", exist_ok=True)
+        host = MultiCameraHost(cameras, policy=EventPolicy(args.cooldown, args.min_confidence),
+                               preview=args.preview, profile=args.profile)
+        host.run()
+    except Exception as e:
+        print(f"\nError: {str(e)}")
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
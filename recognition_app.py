@@ -7,6 +7,8 @@ from src.database.db_operations import DatabaseOperations
 from src.utils.camera_controls import CameraControls
 from src.utils.ui_feedback import UIFeedback
 from src.utils.detection import FaceDetector
+from src.utils.tracking import DetectionScheduler
+from src.utils.motion import MotionGate
 
 class RecognitionApp:
     def __init__(self):
@@ -180,8 +182,8 @@ class RecognitionApp:
                 if camera.is_running:
                     frame = camera.read_frame()
                     if frame is not None:
-                        # Detect faces
-                        faces = detector.detect_faces(frame)
+                        # Detect and recognize faces
+                        faces = detector.detect(frame, recognize=True)
                         
                         # Draw detection boxes
                         frame = detector.draw_faces(frame, faces)
@@ -230,6 +232,8 @@ class RecognitionApp:
             # Initialize camera and detector
             camera = CameraControls()
             detector = FaceDetector()
+            scheduler = DetectionScheduler(detector.detect_faces)
+            motion = MotionGate()
             
             def on_capture(filename, image_bytes):
                 # Save the captured frame
@@ -254,8 +258,14 @@ class RecognitionApp:
                 if camera.is_running:
                     frame = camera.read_frame()
                     if frame is not None:
-                        # Detect and recognize faces
-                        faces = detector.detect_faces(frame)
+                        # Detect and recognize faces while something moves in front of the camera
+                        faces = []
+                        if motion.update(frame):
+                            faces = detector.describe(frame, scheduler.update(frame), recognize=True)
+                            if faces:
+                                motion.touch()
+                        else:
+                            scheduler.reset()
                         frame = detector.draw_faces(frame, faces)
                         
                         # Show the frame
@@ -1,50 +1,60 @@
 #!/usr/bin/env python3
 import os
 import sys
+import argparse
 import traceback
 from src.database.init_database import create_directories
 from src.database.db_operations import DatabaseOperations
 from face_recognition import FaceRecognitionSystem
+from src.utils.events import EventPolicy
 
-def init_system():
-    """Initialize the face recognition system"""
+def check_gui():
+    """Check the desktop services and pick a GUI backend for the windows"""
+    # Check DBus availability
     try:
-        print("Initializing Face Recognition System...")
+        import dbus
+        bus = dbus.SessionBus()
+        print("DBus session bus available")
         
-        # Check DBus availability
+        # Check portal service
         try:
-            import dbus
-            bus = dbus.SessionBus()
-            print("DBus session bus available")
-            
-            # Check portal service
-            try:
-                portal = bus.get_object('org.freedesktop.portal.Desktop',
-                                      '/org/freedesktop/portal/desktop')
-                print("Desktop portal service available")
-            except dbus.exceptions.DBusException as e:
-                print(f"Desktop portal error: {e}")
-        except ImportError:
-            print("DBus Python bindings not available")
+            portal = bus.get_object('org.freedesktop.portal.Desktop',
+                                  '/org/freedesktop/portal/desktop')
+            print("Desktop portal service available")
+        except dbus.exceptions.DBusException as e:
+            print(f"Desktop portal error: {e}")
+    except ImportError:
+        print("DBus Python bindings not available")
+    except Exception as e:
+        print(f"DBus connection error: {e}")
+    
+    # Try different GUI backends
+    gui_backends = ['GTK3', 'GTK', 'QT', 'TK']
+    backend_found = False
+    for backend in gui_backends:
+        try:
+            os.environ['OPENCV_VIDEOIO_PRIORITY_BACKEND'] = '0'  # Prefer built-in backend
+            os.environ['QT_QPA_PLATFORM'] = backend.lower()
+            print(f"Successfully initialized {backend} backend")
+            backend_found = True
+            break
         except Exception as e:
-            print(f"DBus connection error: {e}")
+            print(f"Backend {backend} failed: {str(e)}")
+            continue
+            
+    if not backend_found:
+        print("Warning: No GUI backend was successfully initialized")
+
+def init_system(headless=False):
+    """Initialize the face recognition system
+
+    headless skips the desktop and GUI backend checks.
+    """
+    try:
+        print("Initializing Face Recognition System...")
         
-        # Try different GUI backends
-        gui_backends = ['GTK3', 'GTK', 'QT', 'TK']
-        backend_found = False
-        for backend in gui_backends:
-            try:
-                os.environ['OPENCV_VIDEOIO_PRIORITY_BACKEND'] = '0'  # Prefer built-in backend
-                os.environ['QT_QPA_PLATFORM'] = backend.lower()
-                print(f"Successfully initialized {backend} backend")
-                backend_found = True
-                break
-            except Exception as e:
-                print(f"Backend {backend} failed: {str(e)}")
-                continue
-                
-        if not backend_found:
-            print("Warning: No GUI backend was successfully initialized")
+        if not headless:
+            check_gui()
         
         # Create necessary directories
         print("Creating directories...")
@@ -69,16 +79,32 @@ def init_system():
         return False
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the face recognition system")
+    parser.add_argument('--headless', action='store_true',
+                        help='no windows: record events by policy, stop with SIGINT/SIGTERM')
+    parser.add_argument('--place', type=int, help='place to record events for (default: 1)')
+    parser.add_argument('--profile', help='capture profile, e.g. 480p, 720p, 1080p or one from '
+                                          'data/capture_profiles.json')
+    parser.add_argument('--cooldown', type=float, default=60,
+                        help='headless: seconds before the same user is recorded again')
+    parser.add_argument('--min-confidence', type=float, default=0,
+                        help='headless: minimum confidence to record an event')
+    args = parser.parse_args()
+    
     try:
         # Initialize system
-        if not init_system():
+        if not init_system(args.headless):
             print("System initialization failed")
             return
         
         # Start face recognition
         print("\nStarting Face Recognition System...")
         face_system = FaceRecognitionSystem()
-        face_system.run()
+        if args.place is not None:
+            face_system.current_place_id = args.place
+        face_system.capture_profile = args.profile
+        face_system.run(headless=args.headless,
+                        policy=EventPolicy(args.cooldown, args.min_confidence))
         
     except KeyboardInterrupt:
         print("\nShutting down gracefully...")
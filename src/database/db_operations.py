@@ -1,13 +1,54 @@
+import json
+import weakref
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-from src.database.models import User, FaceSample, Place, RecognitionEvent, init_db
+from src.database.models import User, FaceSample, Place, PlaceDetectionSettings, RecognitionEvent, init_db
 
 class DatabaseOperations:
+    # Callbacks notified of data changes, shared by every instance so caches
+    # built from one session see writes made through another
+    _listeners = {}
+
     def __init__(self):
         self.engine = init_db()
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
 
+    # Change notifications
+    @classmethod
+    def subscribe(cls, event, callback):
+        """Register a callback for a change event (e.g. 'face_sample_added')
+
+        Bound methods are held weakly so subscribing does not keep
+        short-lived recognizers and windows alive.
+        """
+        if hasattr(callback, '__self__'):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+        cls._listeners.setdefault(event, []).append(ref)
+
+    @classmethod
+    def unsubscribe(cls, event, callback):
+        """Remove a previously registered callback"""
+        cls._listeners[event] = [
+            ref for ref in cls._listeners.get(event, [])
+            if ref() is not None and ref() != callback
+        ]
+
+    def _notify(self, event, *args):
+        """Invoke all callbacks registered for an event"""
+        refs = self._listeners.get(event, [])
+        refs[:] = [ref for ref in refs if ref() is not None]
+        for ref in list(refs):
+            callback = ref()
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in '{event}' listener: {e}")
+
     # User operations
     def add_user(self, name):
         """Add a new user to the database"""
@@ -38,12 +79,28 @@ class DatabaseOperations:
         face_sample = FaceSample(user_id=user_id, image_path=image_path)
         self.session.add(face_sample)
         self.session.commit()
+        self._notify('face_sample_added', face_sample)
         return face_sample
 
     def get_user_face_samples(self, user_id):
         """Get all face samples for a user"""
         return self.session.query(FaceSample).filter(FaceSample.user_id == user_id).all()
 
+    def delete_face_sample(self, sample_id):
+        """Delete a face sample"""
+        face_sample = self.session.query(FaceSample).filter(FaceSample.id == sample_id).first()
+        if face_sample:
+            self.session.delete(face_sample)
+            self.session.commit()
+            self._notify('face_sample_deleted', face_sample)
+        return face_sample
+
+    def get_all_face_samples(self):
+        """Get all face samples ordered by user and sample ID"""
+        return self.session.query(FaceSample).order_by(
+            FaceSample.user_id, FaceSample.id
+        ).all()
+
     # Place operations
     def add_place(self, name, description=""):
         """Add a new place"""
@@ -71,20 +128,62 @@ class DatabaseOperations:
             self.session.commit()
         return place
 
+    def get_place_detection_settings(self, place_id):
+        """Get the detection settings of a place, or None if it uses the defaults"""
+        return self.session.query(PlaceDetectionSettings).filter(
+            PlaceDetectionSettings.place_id == place_id
+        ).first()
+
+    def set_place_detection_settings(self, place_id, regions=None, min_face_size=None, max_face_size=None,
+                                     scale_factor=None, min_neighbors=None):
+        """Create or replace the detection settings of a place
+
+        regions is a list of rectangles [x, y, w, h] or polygons
+        [[x, y], ...] in fractions of the frame size; None scans the whole
+        frame. Other values left as None fall back to the detector defaults.
+        """
+        settings = self.get_place_detection_settings(place_id)
+        if settings is None:
+            settings = PlaceDetectionSettings(place_id=place_id)
+            self.session.add(settings)
+        settings.roi = json.dumps(regions) if regions else None
+        settings.min_face_size = min_face_size
+        settings.max_face_size = max_face_size
+        settings.scale_factor = scale_factor
+        settings.min_neighbors = min_neighbors
+        self.session.commit()
+        self._notify('place_detection_settings_changed', settings)
+        return settings
+
     # Recognition Event operations
-    def add_recognition_event(self, user_id, place_id, image_path, confidence_score=None, difference_score=None):
-        """Record a new recognition event with confidence and difference scores"""
+    def add_recognition_event(self, user_id, place_id, image_path, confidence_score=None, difference_score=None,
+                              timestamp=None):
+        """Record a new recognition event with confidence and difference scores
+
+        timestamp (UTC) defaults to now; set it when back-filling events.
+        """
         event = RecognitionEvent(
             user_id=user_id,
             place_id=place_id,
             image_path=image_path,
             confidence_score=confidence_score,
-            difference_score=difference_score
+            difference_score=difference_score,
+            timestamp=timestamp
         )
         self.session.add(event)
         self.session.commit()
         return event
 
+    def add_recognition_events(self, events):
+        """Record many recognition events in one transaction
+
+        events are dicts with add_recognition_event()'s arguments.
+        """
+        records = [RecognitionEvent(**event) for event in events]
+        self.session.add_all(records)
+        self.session.commit()
+        return records
+
     def get_user_recognition_events(self, user_id):
         """Get all recognition events for a user"""
         return self.session.query(RecognitionEvent).filter(
@@ -11,6 +11,7 @@ def create_directories():
     dirs = [
         'data/face_samples',
         'data/recognition_events',
+        'data/models',
     ]
     for dir_path in dirs:
         os.makedirs(dir_path, exist_ok=True)
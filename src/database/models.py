@@ -1,3 +1,4 @@
+import json
 from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -5,6 +6,8 @@ from datetime import datetime
 
 Base = declarative_base()
 
+DATABASE_PATH = 'database.sqlite'
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -40,12 +43,38 @@ class Place(Base):
     name = Column(String, nullable=False)
     description = Column(String)
     
-    # Relationship
+    # Relationships
     recognition_events = relationship("RecognitionEvent", back_populates="place")
+    detection_settings = relationship("PlaceDetectionSettings", back_populates="place", uselist=False)
     
     def __repr__(self):
         return f"<Place(name='{self.name}')>"
 
+class PlaceDetectionSettings(Base):
+    __tablename__ = 'place_detection_settings'
+    
+    id = Column(Integer, primary_key=True)
+    place_id = Column(Integer, ForeignKey('places.id'), unique=True, nullable=False)
+    # JSON list of regions of interest in fractions of the frame size, each
+    # either a rectangle [x, y, w, h] or a polygon [[x, y], [x, y], ...]
+    roi = Column(String)
+    min_face_size = Column(Integer)  # Face size range in full-resolution pixels
+    max_face_size = Column(Integer)
+    scale_factor = Column(Float)     # Cascade detectMultiScale parameters
+    min_neighbors = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationship
+    place = relationship("Place", back_populates="detection_settings")
+    
+    @property
+    def regions(self):
+        """Decoded list of ROI rectangles and polygons, empty for the whole frame"""
+        return json.loads(self.roi) if self.roi else []
+    
+    def __repr__(self):
+        return f"<PlaceDetectionSettings(place_id={self.place_id}, min_face_size={self.min_face_size})>"
+
 class RecognitionEvent(Base):
     __tablename__ = 'recognition_events'
     
@@ -66,6 +95,6 @@ class RecognitionEvent(Base):
 
 # Database initialization function
 def init_db():
-    engine = create_engine('sqlite:///database.sqlite')
+    engine = create_engine(f'sqlite:///{DATABASE_PATH}')
     Base.metadata.create_all(engine)
     return engine
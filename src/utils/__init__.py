@@ -1,5 +1,14 @@
 from .camera_controls import CameraControls
 from .ui_feedback import UIFeedback
-from .detection import FaceDetector
+from .detection import FaceDetector, FaceDetection
+from .detectors import DetectorBackend, DetectionTuner, create_detector_backend
+from .gallery import FaceGallery
+from .matching import BatchedMatcher
+from .ann_index import IVFIndex
+from .tracking import FaceTracker, DetectionScheduler
+from .motion import MotionGate
+from .pipeline import Pipeline
+from .events import EventPolicy
+from .sources import FrameSource, VideoFileSource, ImageSequenceSource, create_frame_source
 
-__all__ = ['CameraControls', 'UIFeedback', 'FaceDetector']
\ No newline at end of file
+__all__ = ['CameraControls', 'UIFeedback', 'FaceDetector', 'FaceDetection', 'DetectorBackend', 'DetectionTuner', 'create_detector_backend', 'FaceGallery', 'BatchedMatcher', 'IVFIndex', 'FaceTracker', 'DetectionScheduler', 'MotionGate', 'Pipeline', 'EventPolicy', 'FrameSource', 'VideoFileSource', 'ImageSequenceSource', 'create_frame_source']
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import threading
+import numpy as np
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over normalized vectors
+
+    Vectors are clustered around a set of k-means centroids and stored in
+    one inverted list per centroid. A search only scans the n_probe lists
+    whose centroids are closest to the query, so n_probe is the
+    recall/latency knob: higher values scan more of the index. Until enough
+    vectors have been added to train the centroids the index falls back to
+    an exact scan.
+    """
+
+    def __init__(self, dim, n_probe=8, min_train_size=1000, kmeans_iterations=10):
+        self.dim = dim
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.centroids = None
+        self.lists = []        # per-list (vectors, ids)
+        self.trained_size = 0
+        self.pending = (np.zeros((0, dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+        self.ids = set()
+        self.lock = threading.Lock()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def add(self, vectors, ids):
+        """Add normalized vectors with integer IDs, training once large enough"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        keep = np.array([i not in self.ids for i in ids], dtype=bool)
+        vectors, ids = vectors[keep], ids[keep]
+        if len(ids) == 0:
+            return
+
+        with self.lock:
+            self.ids.update(ids.tolist())
+            if not self.is_trained:
+                pending_vectors = np.concatenate([self.pending[0], vectors])
+                pending_ids = np.concatenate([self.pending[1], ids])
+                if len(pending_ids) >= self.min_train_size:
+                    self._train(pending_vectors, pending_ids)
+                else:
+                    self.pending = (pending_vectors, pending_ids)
+                return
+
+            self._assign(vectors, ids)
+            # Clusters drift as the collection grows well past the training set
+            if len(self.ids) > 4 * self.trained_size:
+                self._train(*self._all_entries())
+
+    def search(self, queries, k=10, n_probe=None):
+        """Return (ids, scores) arrays of shape (n_queries, <=k), best first"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        n_probe = n_probe or self.n_probe
+
+        with self.lock:
+            centroids, lists, pending = self.centroids, list(self.lists), self.pending
+
+        if centroids is None:
+            candidates = [pending] * len(queries)
+        else:
+            probe_lists = np.argsort(-(queries @ centroids.T), axis=1)[:, :n_probe]
+            candidates = [
+                self._concat([lists[i] for i in row]) for row in probe_lists
+            ]
+
+        result_ids, result_scores = [], []
+        for query, (vectors, ids) in zip(queries, candidates):
+            if len(ids) == 0:
+                result_ids.append(np.zeros(0, dtype=np.int64))
+                result_scores.append(np.zeros(0, dtype=np.float32))
+                continue
+            scores = vectors @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            result_ids.append(ids[top])
+            result_scores.append(scores[top])
+        return result_ids, result_scores
+
+    def save(self, path):
+        """Persist the index to an .npz file"""
+        with self.lock:
+            vectors, ids = self._all_entries()
+            centroids = self.centroids if self.is_trained else np.zeros((0, self.dim), dtype=np.float32)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    dim=self.dim,
+                    centroids=centroids,
+                    vectors=vectors.astype(np.float16),
+                    ids=ids,
+                    trained_size=self.trained_size,
+                )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load an index saved with save(), or return None if unreadable"""
+        try:
+            with np.load(path) as data:
+                index = cls(int(data['dim']), **kwargs)
+                vectors = data['vectors'].astype(np.float32)
+                ids = data['ids']
+                index.ids = set(ids.tolist())
+                if len(data['centroids']):
+                    index.centroids = data['centroids']
+                    index.trained_size = int(data['trained_size'])
+                    index.lists = [(np.zeros((0, index.dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+                                   for _ in range(len(index.centroids))]
+                    index._assign(vectors, ids)
+                else:
+                    index.pending = (vectors, ids)
+            return index
+        except Exception as e:
+            print(f"Error loading ANN index {path}: {e}")
+            return None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _train(self, vectors, ids):
+        """Cluster vectors with spherical k-means and rebuild the inverted lists"""
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), 32 * n_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        self.centroids = centroids
+        self.trained_size = len(vectors)
+        self.lists = [(np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+                      for _ in range(n_lists)]
+        self.pending = (np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+        self._assign(vectors, ids)
+
+    def _assign(self, vectors, ids):
+        """Append vectors to the inverted list of their nearest centroid"""
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in np.unique(assignment):
+            mask = assignment == c
+            list_vectors, list_ids = self.lists[c]
+            self.lists[c] = (np.concatenate([list_vectors, vectors[mask]]),
+                             np.concatenate([list_ids, ids[mask]]))
+
+    def _all_entries(self):
+        """Return every stored (vectors, ids), trained or pending"""
+        return self._concat(self.lists + [self.pending])
+
+    def _concat(self, entries):
+        if not entries:
+            return np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return (np.concatenate([vectors for vectors, _ in entries]),
+                np.concatenate([ids for _, ids in entries]))
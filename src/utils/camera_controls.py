@@ -1,61 +1,443 @@
+import os
 import cv2
+import json
 import time
+import queue
+import threading
+import numpy as np
 from typing import Callable, Optional
 from datetime import datetime
+from collections import deque
+from dataclasses import dataclass, asdict
+
+# Device and OpenCV backend that last worked, per place
+CAMERA_CACHE_PATH = "data/camera_cache.json"
+CAMERA_INDICES = [0, 1, -1, "/dev/video0", "/dev/video1"]
+
+# Named capture profiles, added to and overriding CAPTURE_PRESETS
+CAPTURE_PROFILES_PATH = "data/capture_profiles.json"
+CAPTURE_PRESETS = {
+    "480p": {"width": 640, "height": 480, "fps": 30, "fourcc": "MJPG", "buffer_size": 1},
+    "720p": {"width": 1280, "height": 720, "fps": 30, "fourcc": "MJPG", "buffer_size": 1},
+    "1080p": {"width": 1920, "height": 1080, "fps": 30, "fourcc": "MJPG", "buffer_size": 1},
+}
+
+@dataclass
+class CaptureProfile:
+    """Capture format requested from a camera; None keeps the driver default
+
+    USB cameras usually default to uncompressed YUYV, which the bus limits
+    to low frame rates at high resolutions; MJPG reaches full rate.
+    buffer_size is the driver's frame queue, 1 keeps latency lowest.
+    """
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    fourcc: Optional[str] = None
+    buffer_size: Optional[int] = None
+
+    @classmethod
+    def load(cls, profile=None, path=CAPTURE_PROFILES_PATH):
+        """Resolve a profile name, settings dict or CaptureProfile"""
+        if profile is None or isinstance(profile, cls):
+            return profile
+        if isinstance(profile, dict):
+            return cls(**profile)
+        profiles = dict(CAPTURE_PRESETS)
+        if os.path.exists(path):
+            with open(path) as f:
+                profiles.update(json.load(f))
+        if profile not in profiles:
+            raise ValueError(f"Unknown capture profile '{profile}', expected one of {sorted(profiles)}")
+        return cls(**profiles[profile])
+
+    def apply(self, cap):
+        """Request the settings; the pixel format goes first as it limits the sizes"""
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+
+    def mismatches(self, negotiated):
+        """List the requested settings the camera did not accept"""
+        mismatches = []
+        for key, requested in asdict(self).items():
+            actual = negotiated.get(key)
+            if requested is None or actual == requested:
+                continue
+            # Drivers report rates like 29.97 for 30
+            if key == "fps" and actual and abs(actual - requested) < 0.5:
+                continue
+            mismatches.append(f"{key} {actual} instead of {requested}")
+        return mismatches
+
+def describe_capture(cap, frame):
+    """Return the format a capture actually delivers"""
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return {
+        "width": frame.shape[1],
+        "height": frame.shape[0],
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "fourcc": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\0 ") or None,
+        "buffer_size": max(0, int(cap.get(cv2.CAP_PROP_BUFFERSIZE))) or None,
+    }
 
 class CameraControls:
-    def __init__(self):
+    """Camera capture with device selection, capture profiles and a background reader
+
+    start() probes the candidate devices concurrently. For probe_timeout
+    seconds the earliest candidate in CAMERA_INDICES order is preferred;
+    after that, start() takes the first device to deliver a frame, however
+    long opening takes, and fails only once every candidate has failed.
+    A slow camera can therefore lose to a lower priority one that opens
+    within probe_timeout, and that choice is remembered for the place:
+    raise probe_timeout for USB or IP cameras that take longer to open.
+    """
+
+    # Selections loaded from CAMERA_CACHE_PATH, shared by every instance
+    selections = None
+    selections_lock = threading.Lock()
+
+    def __init__(self, threaded: bool = True, device_id=None, place_id=None, probe_timeout: float = 2.0,
+                 profile=None):
         self.cap = None
+        self.device_id = device_id  # Device start() opens unless given another
+        self.place_id = place_id    # Key of the remembered device selection
+        self.probe_timeout = probe_timeout
+        # Requested capture format (name, dict or CaptureProfile) and the
+        # format the camera actually negotiated at start()
+        self.profile = CaptureProfile.load(profile)
+        self.negotiated = None
+        self.device = None          # Device and backend actually opened
+        self.backend_name = None
         self.is_running = False
+        # Background capture keeps only the newest frame so slow processing
+        # never builds up driver buffer lag or blocks the UI thread
+        self.threaded = threaded
+        self.capture_thread: Optional[threading.Thread] = None
+        self.frame_ready = threading.Condition()
+        self.front_buffer = None    # Newest complete frame
+        self.back_buffer = None     # Frame being written by the capture thread
+        self.frame_id = 0           # Frames captured so far
+        self.consumed_id = 0        # Last frame handed out by latest()/next_frame()
+        self.frames_dropped = 0     # Frames overwritten before anyone read them
+        self.frame_times = deque(maxlen=60)  # Arrival of recent frames, for measured_fps()
         self.last_capture_time = 0
         self.capture_cooldown = 1.0  # Cooldown in seconds between captures
         self.on_capture_callback: Optional[Callable] = None
         self.on_status_change: Optional[Callable] = None
         self.preview_window_name = "Camera Preview"
 
-    def start(self, device_id: int = 0) -> bool:
-        """Start the camera capture"""
-        # Try different camera indices if the first one fails
-        camera_indices = [0, 1, -1, "/dev/video0", "/dev/video1"]
+    def start(self, device_id=None) -> bool:
+        """Start the camera capture
+
+        device_id selects a device index, path or stream URL. Without it (or
+        a device_id given to the constructor) the device and backend that
+        last worked for this place are reopened, and if that fails the usual
+        camera indices are probed concurrently.
+        """
+        if device_id is None:
+            device_id = self.device_id
         
-        for idx in camera_indices:
-            try:
-                self.cap = cv2.VideoCapture(idx)
-                if self.cap.isOpened():
-                    # Test read a frame
-                    ret, _ = self.cap.read()
-                    if ret:
-                        self.is_running = True
-                        self._update_status(f"Camera started (index: {idx})")
-                        return True
-                    else:
-                        self.cap.release()
-                        
-            except Exception as e:
-                print(f"Failed to open camera {idx}: {str(e)}")
-                if self.cap:
-                    self.cap.release()
-                continue
+        if device_id is not None:
+            opened = self.open_first([(device_id, None)], self.probe_timeout, self.profile)
+        else:
+            selection = self.cached_selection(self.place_id)
+            opened = None
+            if selection:
+                opened = self.open_first([(selection["device"], selection["backend"])],
+                                         self.probe_timeout, self.profile)
+            if opened is None:
+                opened = self.open_first([(idx, None) for idx in CAMERA_INDICES],
+                                         self.probe_timeout, self.profile)
+                if opened is not None:
+                    self.remember_selection(self.place_id, opened[2], opened[3])
+        
+        if opened is None:
+            self._update_status("Failed to open any camera")
+            return False
         
-        self._update_status("Failed to open any camera")
-        return False
+        self.cap, frame, self.device, self.backend_name = opened
+        self.negotiated = describe_capture(self.cap, frame)
+        self.is_running = True
+        if self.threaded:
+            self._start_capture_thread(frame)
+        self._update_status(f"Camera started (index: {self.device}, backend: {self.backend_name}, "
+                            f"{self.format_capture()})")
+        if self.profile:
+            for mismatch in self.profile.mismatches(self.negotiated):
+                print(f"Warning: camera {self.device} negotiated {mismatch}")
+        return True
+
+    def format_capture(self):
+        """Describe the negotiated format, e.g. for logs"""
+        if not self.negotiated:
+            return "not started"
+        n = self.negotiated
+        text = f"{n['width']}x{n['height']} @ {n['fps']:.1f} fps"
+        if n["fourcc"]:
+            text += f" {n['fourcc']}"
+        if n["buffer_size"]:
+            text += f", buffer {n['buffer_size']}"
+        return text
+
+    def measured_fps(self):
+        """Rate frames actually arrived at recently, which drivers may not honor in fps"""
+        with self.frame_ready:
+            times = list(self.frame_times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    @staticmethod
+    def probe(device, backend=None, profile=None):
+        """Open a device, apply a CaptureProfile and read a test frame
+
+        backend is an OpenCV capture API name such as "V4L2"; without it
+        OpenCV tries each API in turn. Returns (cap, frame, device, backend)
+        or None if the device gave no frame.
+        """
+        try:
+            api = getattr(cv2, f"CAP_{backend}", cv2.CAP_ANY) if backend else cv2.CAP_ANY
+            cap = cv2.VideoCapture(device, api)
+            if cap.isOpened():
+                # Set the format before streaming starts with the first read
+                if profile:
+                    profile.apply(cap)
+                ret, frame = cap.read()
+                if ret:
+                    return cap, frame, device, cap.getBackendName()
+            cap.release()
+        except Exception as e:
+            print(f"Failed to open camera {device}: {str(e)}")
+        return None
+
+    @staticmethod
+    def device_key(device):
+        """Name a device by its node, so aliases of one camera compare equal
+
+        Under V4L2 index n is /dev/video<n> and -1 opens the first camera;
+        device paths may be symlinks such as /dev/v4l/by-id/...
+        """
+        if isinstance(device, int):
+            device = f"/dev/video{max(device, 0)}"
+        if device.startswith("/dev/"):
+            return os.path.realpath(device)
+        return device
+
+    @classmethod
+    def open_first(cls, candidates, timeout=2.0, profile=None):
+        """Probe (device, backend) candidates concurrently, preferring earlier ones
+
+        Returns probe() of the first candidate, in the given order, to
+        deliver a frame within timeout seconds. It returns as soon as a probe
+        succeeds and every candidate before it has failed. If none has
+        succeeded by the timeout, it keeps waiting for the first one that
+        does, and returns None once all have failed.
+        Aliases of a device already listed are skipped, since a camera
+        cannot be opened twice at once. Opening a missing device can block
+        for seconds and cannot be interrupted, so probes that finish too
+        late release their capture themselves.
+        """
+        seen = set()
+        unique = []
+        for device, backend in candidates:
+            key = (cls.device_key(device), backend)
+            if key not in seen:
+                seen.add(key)
+                unique.append((device, backend))
+
+        results = [None] * len(unique)  # None while probing, then the probe or False
+        finished = threading.Condition()
+        done = [False]
+        
+        def run_probe(i, device, backend):
+            opened = cls.probe(device, backend, profile)
+            with finished:
+                if not done[0]:
+                    results[i] = opened or False
+                    finished.notify_all()
+                    return
+            if opened:
+                opened[0].release()
+        
+        def decided():
+            for opened in results:
+                if opened is None:
+                    return False
+                if opened:
+                    return True
+            return True
+        
+        for i, (device, backend) in enumerate(unique):
+            threading.Thread(target=run_probe, args=(i, device, backend), daemon=True).start()
+        
+        with finished:
+            finished.wait_for(decided, timeout)
+            if not any(results):
+                finished.wait_for(lambda: any(results) or all(opened is not None for opened in results))
+            done[0] = True
+        winner = next((opened for opened in results if opened), None)
+        
+        # Release the lower priority probes that also succeeded
+        for opened in results:
+            if opened and opened is not winner:
+                opened[0].release()
+        return winner
+
+    @classmethod
+    def select_device(cls, place_id=None, timeout=2.0):
+        """Find and remember a working camera without keeping it open
+
+        Call it ahead of time (e.g. at application start) so that start()
+        can reopen the selection directly. Returns the selection or None.
+        """
+        selection = cls.cached_selection(place_id)
+        if selection:
+            return selection
+        opened = cls.open_first([(idx, None) for idx in CAMERA_INDICES], timeout)
+        if opened is None:
+            return None
+        opened[0].release()
+        return cls.remember_selection(place_id, opened[2], opened[3])
+
+    @classmethod
+    def cached_selection(cls, place_id=None):
+        """Return the {"device", "backend"} that last worked for a place, or None"""
+        with cls.selections_lock:
+            if cls.selections is None:
+                cls.selections = {}
+                if os.path.exists(CAMERA_CACHE_PATH):
+                    try:
+                        with open(CAMERA_CACHE_PATH) as f:
+                            cls.selections = json.load(f)
+                    except (OSError, ValueError) as e:
+                        print(f"Error loading camera cache: {e}")
+            return cls.selections.get(cls._selection_key(place_id))
+
+    @classmethod
+    def remember_selection(cls, place_id, device, backend):
+        """Store the device and backend that worked for a place"""
+        selection = {"device": device, "backend": backend}
+        cls.cached_selection(place_id)  # Load the cache before updating it
+        with cls.selections_lock:
+            cls.selections[cls._selection_key(place_id)] = selection
+            try:
+                os.makedirs(os.path.dirname(CAMERA_CACHE_PATH), exist_ok=True)
+                with open(CAMERA_CACHE_PATH, "w") as f:
+                    json.dump(cls.selections, f, indent=2)
+            except OSError as e:
+                print(f"Error saving camera cache: {e}")
+        return selection
+
+    @staticmethod
+    def _selection_key(place_id):
+        return "default" if place_id is None else str(place_id)
 
     def stop(self):
         """Stop the camera capture"""
         if self.cap:
             self.is_running = False
+            with self.frame_ready:
+                self.frame_ready.notify_all()
+            if self.capture_thread and self.capture_thread is not threading.current_thread():
+                self.capture_thread.join(timeout=1.0)
+            self.capture_thread = None
             self.cap.release()
-            cv2.destroyAllWindows()
+            try:
+                cv2.destroyAllWindows()
+            except cv2.error:
+                pass  # Headless OpenCV builds have no HighGUI
             self._update_status("Camera stopped")
 
     def read_frame(self):
-        """Read a frame from the camera"""
+        """Read a frame from the camera
+
+        With background capture this never blocks: it returns the newest
+        frame, or None if no new frame arrived since the last call.
+        """
         if not self.is_running or not self.cap:
             return None
+        if self.threaded:
+            return self.latest()
 
         ret, frame = self.cap.read()
+        if ret:
+            self.frame_times.append(time.monotonic())
         return frame if ret else None
 
+    def latest(self, new_only: bool = True):
+        """Return a copy of the newest captured frame without blocking
+
+        Returns None if the camera is not running, or with new_only if no
+        frame arrived since the last latest()/next_frame() call.
+        """
+        with self.frame_ready:
+            if self.front_buffer is None or (new_only and self.frame_id == self.consumed_id):
+                return None
+            self.consumed_id = self.frame_id
+            return self.front_buffer.copy()
+
+    def wait_frame(self, timeout: float = 1.0) -> bool:
+        """Wait up to timeout seconds for a frame newer than the last one returned
+
+        Returns whether one is ready for next_frame(). Without the capture
+        thread frames are read on demand, so one is ready while running.
+        """
+        if not self.threaded:
+            return self.is_running
+        with self.frame_ready:
+            self.frame_ready.wait_for(
+                lambda: self.frame_id != self.consumed_id or not self.is_running, timeout)
+            return self.is_running and self.frame_id != self.consumed_id
+
+    def next_frame(self, timeout: float = 1.0):
+        """Wait up to timeout seconds for a frame newer than the last one returned"""
+        if not self.threaded:
+            return self.read_frame()
+        self.wait_frame(timeout)
+        return self.latest()
+
+    def _start_capture_thread(self, first_frame):
+        """Preallocate the frame buffers and start grabbing in the background"""
+        self.front_buffer = first_frame
+        self.back_buffer = np.empty_like(first_frame)
+        self.frame_id = 1
+        self.consumed_id = 0
+        self.frames_dropped = 0
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
+
+    def _capture_loop(self):
+        """Keep reading frames into the back buffer and publish the newest"""
+        failures = 0
+        while self.is_running:
+            ret, frame = self.cap.read(self.back_buffer)
+            if not ret:
+                failures += 1
+                if failures == 100:
+                    print("Error reading from camera: no frames received")
+                time.sleep(0.01)
+                continue
+            failures = 0
+
+            with self.frame_ready:
+                if self.frame_id != self.consumed_id:
+                    self.frames_dropped += 1
+                # read() allocates a new array if the frame size changed
+                self.back_buffer, self.front_buffer = self.front_buffer, frame
+                if self.back_buffer is None or self.back_buffer.shape != frame.shape:
+                    self.back_buffer = np.empty_like(frame)
+                self.frame_id += 1
+                self.frame_times.append(time.monotonic())
+                self.frame_ready.notify_all()
+
     def capture_photo(self) -> Optional[tuple[str, bytes]]:
         """Capture a photo when spacebar is pressed"""
         current_time = time.time()
@@ -64,7 +446,7 @@ class CameraControls:
         if current_time - self.last_capture_time < self.capture_cooldown:
             return None
             
-        frame = self.read_frame()
+        frame = self.latest(new_only=False) if self.threaded else self.read_frame()
         if frame is not None:
             # Generate filename with timestamp
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1,40 +1,118 @@
 import cv2
 import numpy as np
+from dataclasses import dataclass, field
 from src.database.db_operations import DatabaseOperations
+from src.utils.gallery import FaceGallery
+from src.utils.detectors import DetectorBackend, DetectionTuner, create_detector_backend
+
+@dataclass
+class FaceDetection:
+    """A detected face: its box, eyes (relative to the box) and grayscale ROI"""
+    box: tuple
+    eyes: list = field(default_factory=list)
+    gray: object = None
+    user: object = None         # Matching User once recognized, else None
+    confidence: float = 0
+    recognized: bool = False
 
 class FaceDetector:
-    def __init__(self):
+    def __init__(self, gallery=None, backend=None, detection_scale=1.0, min_face_size=30, place_id=None,
+                 auto_tune=True):
         self.db = DatabaseOperations()
-        # Load the pre-trained face detection cascade
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        # Preprocessed samples of all users, shared between detectors
+        self.gallery = gallery if gallery is not None else FaceGallery.shared()
+        # Face detector backend, by name or instance; None picks FACE_DETECTOR_BACKEND.
+        # It detects on a frame downscaled by detection_scale, boxes stay in full resolution
+        if not isinstance(backend, DetectorBackend):
+            backend = create_detector_backend(backend, scale=detection_scale, min_face_size=min_face_size)
+        self.backend = backend
+        # Narrows the scanned face sizes and area to the faces seen so far
+        self.tuner = DetectionTuner(backend) if auto_tune else None
+        # Per-place ROI and face size range, kept in sync with the database
+        self.place_id = place_id
+        if place_id is not None:
+            self.backend.apply_settings(self.db.get_place_detection_settings(place_id))
+            DatabaseOperations.subscribe('place_detection_settings_changed', self._on_place_settings_changed)
         # Load eye cascade for additional verification
         self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        self.last_frame = None
+        self.last_detections = []
         
-    def detect_faces(self, frame):
-        """Detect faces in the frame and return their coordinates"""
+    def detect(self, frame, recognize=False, min_confidence=60):
+        """Detect faces and return a FaceDetection record for each
+
+        With a cascade backend every face is verified by finding at least one
+        eye; the eyes found are kept on the record for drawing. recognize
+        also matches every face against the gallery in one batched pass.
+        """
         if frame is None:
             return []
             
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        # Detect faces, on a downscaled copy if configured
+        if self.tuner:
+            faces = self.tuner.detect(frame, observe=False)
+        else:
+            faces = self.backend.detect(frame)
         
-        # Verify faces by checking for eyes
-        verified_faces = []
+        detections = []
         for (x, y, w, h) in faces:
-            face_gray = gray[y:y+h, x:x+w]
-            eyes = self.eye_cascade.detectMultiScale(face_gray)
-            if len(eyes) >= 1:  # At least one eye detected
-                verified_faces.append((x, y, w, h))
+            face_gray = cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+            eyes = []
+            if self.backend.verify_eyes:
+                # Verify faces by checking for eyes in the full-resolution face region
+                eyes = self.eye_cascade.detectMultiScale(face_gray)
+                if len(eyes) < 1:
+                    continue
+            detections.append(FaceDetection((x, y, w, h), [tuple(int(v) for v in eye) for eye in eyes], face_gray))
+        
+        if self.tuner:
+            self.tuner.observe(frame, [detection.box for detection in detections])
+        if recognize:
+            self.recognize(frame, detections, min_confidence)
+        # Remembered so describe() can reuse this work for the same frame
+        self.last_frame, self.last_detections = frame, detections
+        return detections
+
+    def detect_faces(self, frame):
+        """Detect faces in the frame and return their coordinates"""
+        return [detection.box for detection in self.detect(frame)]
+
+    def describe(self, frame, faces, recognize=False, find_eyes=True, min_confidence=60):
+        """Build FaceDetection records for known boxes, e.g. from a DetectionScheduler
+
+        Boxes that detect() just produced for this same frame reuse its
+        records, so neither the eye cascade nor the matcher runs twice.
+        """
+        cached = {}
+        if frame is self.last_frame:
+            cached = {detection.box: detection for detection in self.last_detections}
+        
+        detections = []
+        for face in faces:
+            if isinstance(face, FaceDetection):
+                detections.append(face)
+                continue
+            box = tuple(int(v) for v in face)
+            detection = cached.get(box)
+            if detection is None:
+                x, y, w, h = box
+                face_gray = cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+                eyes = self.eye_cascade.detectMultiScale(face_gray) if find_eyes else []
+                detection = FaceDetection(box, [tuple(int(v) for v in eye) for eye in eyes], face_gray)
+            detections.append(detection)
         
-        return verified_faces
+        if recognize:
+            self.recognize(frame, [d for d in detections if not d.recognized], min_confidence)
+        return detections
+
+    def recognize(self, frame, detections, min_confidence=60):
+        """Fill in the matching user of each detection in one batched pass"""
+        matches = self.match_faces(frame, [detection.box for detection in detections], min_confidence)
+        for detection, (user, confidence) in zip(detections, matches):
+            detection.user = user
+            detection.confidence = confidence
+            detection.recognized = True
+        return detections
         
     def compare_faces(self, face_img, reference_img):
         """Compare two face images and return similarity score"""
@@ -53,50 +131,41 @@ class FaceDetector:
         return correlation * 100  # Convert to percentage
     
     def find_matching_user(self, face_img, min_confidence=60):
-        """Find matching user from database"""
-        users = self.db.get_all_users()
-        best_match = None
-        best_confidence = 0
-        
-        for user in users:
-            # Get user's face samples
-            samples = self.db.get_user_face_samples(user.id)
-            for sample in samples:
-                try:
-                    reference_img = cv2.imread(sample.image_path)
-                    if reference_img is not None:
-                        confidence = self.compare_faces(face_img, reference_img)
-                        if confidence > best_confidence and confidence >= min_confidence:
-                            best_confidence = confidence
-                            best_match = user
-                except Exception as e:
-                    print(f"Error comparing with sample {sample.image_path}: {e}")
-                    continue
-        
-        return best_match, best_confidence
+        """Find matching user from the in-memory gallery"""
+        matches = self.gallery.match([face_img], k=1, min_confidence=min_confidence)[0]
+        if not matches:
+            return None, 0
+        return matches[0]
+
+    def match_faces(self, frame, faces, min_confidence=60):
+        """Find the matching user of every face box in one batched pass"""
+        face_imgs = [frame[y:y+h, x:x+w] for (x, y, w, h) in faces]
+        matches = self.gallery.match(face_imgs, k=1, min_confidence=min_confidence)
+        return [user_matches[0] if user_matches else (None, 0) for user_matches in matches]
     
     def draw_faces(self, frame, faces, show_landmarks=True):
-        """Draw rectangles around detected faces and optionally show facial landmarks"""
-        for (x, y, w, h) in faces:
-            # Get face region
-            face_img = frame[y:y+h, x:x+w]
-            
-            # Try to identify the face
-            user, confidence = self.find_matching_user(face_img)
+        """Draw rectangles around detected faces and optionally show facial landmarks
+
+        faces are FaceDetection records from detect() or describe(); plain
+        boxes are described and recognized first.
+        """
+        if any(not isinstance(face, FaceDetection) for face in faces):
+            faces = self.describe(frame, faces, recognize=True, find_eyes=show_landmarks)
+        unrecognized = [face for face in faces if not face.recognized]
+        if unrecognized:
+            self.recognize(frame, unrecognized)
+
+        for face in faces:
+            x, y, w, h = face.box
+            user, confidence = face.user, face.confidence
             
             # Draw face rectangle with color based on recognition
             color = (0, 255, 0) if user else (0, 165, 255)
             cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
             
             if show_landmarks:
-                # Get the face ROI
-                face_gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-                
-                # Detect eyes in the face region
-                eyes = self.eye_cascade.detectMultiScale(face_gray)
-                
-                # Draw eyes
-                for (ex, ey, ew, eh) in eyes:
+                # Draw the eyes found during detection
+                for (ex, ey, ew, eh) in face.eyes:
                     center = (x + ex + ew//2, y + ey + eh//2)
                     cv2.circle(frame, center, 2, color, 2)
             
@@ -113,4 +182,11 @@ class FaceDetector:
         cv2.putText(frame, f"Detected: {len(faces)}", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
         
-        return frame
\ No newline at end of file
+        return frame
+
+    def _on_place_settings_changed(self, settings):
+        """Apply edited detection settings of our place"""
+        if settings.place_id == self.place_id:
+            self.backend.apply_settings(settings)
+            if self.tuner:
+                self.tuner.reset()
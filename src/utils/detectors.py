@@ -0,0 +1,299 @@
+import os
+from collections import deque
+import cv2
+import numpy as np
+
+# Local model files for the backends OpenCV does not ship with
+DETECTOR_MODEL_DIR = "data/models"
+LBP_CASCADE_PATH = os.path.join(DETECTOR_MODEL_DIR, "lbpcascade_frontalface_improved.xml")
+YUNET_MODEL_PATH = os.path.join(DETECTOR_MODEL_DIR, "face_detection_yunet_2023mar.onnx")
+# Backend used when none is passed explicitly
+DETECTOR_BACKEND_ENV = "FACE_DETECTOR_BACKEND"
+
+class DetectorBackend:
+    """Interface of the face detector backends
+
+    detect() runs the backend on a copy of the frame downscaled by `scale`
+    and returns (x, y, w, h) boxes in full-resolution coordinates.
+    min_face_size and max_face_size are given in full-resolution pixels and
+    scaled along. With regions set, only their bounding rectangles are
+    scanned and, for polygons, only faces centered inside are kept.
+    """
+
+    name = None
+    # Whether FaceDetector should confirm detections with the eye cascade
+    verify_eyes = False
+
+    def __init__(self, scale=1.0, min_face_size=30, max_face_size=None, regions=None):
+        self.scale = scale
+        self.min_face_size = min_face_size
+        self.max_face_size = max_face_size
+        # Rectangles [x, y, w, h] or polygons [[x, y], ...] in fractions of the frame
+        self.regions = regions or []
+        # Values PlaceDetectionSettings can override, restored when unset there
+        self.defaults = {"min_face_size": min_face_size, "max_face_size": max_face_size}
+
+    def apply_settings(self, settings):
+        """Apply a place's PlaceDetectionSettings, or the defaults if it is None"""
+        self.regions = settings.regions if settings is not None else []
+        for key, default in self.defaults.items():
+            value = getattr(settings, key, None)
+            setattr(self, key, value if value else default)
+
+    def detect(self, frame, min_face_size=None, max_face_size=None, regions=None):
+        """Detect faces and return full-resolution (x, y, w, h) boxes
+
+        The keyword arguments override the configured face size range and
+        regions for this call, e.g. for a DetectionTuner.
+        """
+        if frame is None:
+            return []
+        min_face_size = min_face_size or self.min_face_size
+        max_face_size = max_face_size or self.max_face_size
+        regions = regions or self.regions
+        if not regions:
+            return self._detect_area(frame, 0, 0, min_face_size, max_face_size)
+
+        height, width = frame.shape[:2]
+        boxes = []
+        for region in regions:
+            polygon = self._is_polygon(region)
+            points = self._region_points(region, width, height)
+            x, y, w, h = cv2.boundingRect(points)
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + w, width), min(y + h, height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            for box in self._detect_area(frame[y0:y1, x0:x1], x0, y0, min_face_size, max_face_size):
+                bx, by, bw, bh = box
+                if polygon and cv2.pointPolygonTest(points, (bx + bw / 2, by + bh / 2), False) < 0:
+                    continue
+                # Overlapping regions can report the same face twice
+                if not any(self._overlaps(box, other) for other in boxes):
+                    boxes.append(box)
+        return boxes
+
+    def _detect_area(self, image, offset_x, offset_y, min_face_size, max_face_size):
+        """Detect in an image (or ROI crop) and return boxes offset into the full frame"""
+        small = image
+        if self.scale != 1.0:
+            small = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        min_size = max(1, int(round(min_face_size * self.scale)))
+        max_size = int(round(max_face_size * self.scale)) if max_face_size else None
+        faces = self._detect(small, min_size, max_size)
+
+        # Project the boxes back onto the full-resolution image, clipped to it
+        height, width = image.shape[:2]
+        boxes = []
+        for (x, y, w, h) in faces:
+            x0, y0 = max(int(round(x / self.scale)), 0), max(int(round(y / self.scale)), 0)
+            x1 = min(int(round((x + w) / self.scale)), width)
+            y1 = min(int(round((y + h) / self.scale)), height)
+            boxes.append((x0 + offset_x, y0 + offset_y, x1 - x0, y1 - y0))
+        return boxes
+
+    @staticmethod
+    def _is_polygon(region):
+        return len(region) > 0 and isinstance(region[0], (list, tuple))
+
+    @classmethod
+    def _region_points(cls, region, width, height):
+        """Pixel corner points of a rectangle or polygon region"""
+        if cls._is_polygon(region):
+            points = [(px * width, py * height) for px, py in region]
+        else:
+            x, y, w, h = region
+            points = [(x * width, y * height), ((x + w) * width, (y + h) * height)]
+        return np.array(points, dtype=np.float32).round().astype(np.int32)
+
+    @staticmethod
+    def _overlaps(a, b):
+        ix = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+        iy = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+        return ix > 0 and iy > 0 and ix * iy > 0.5 * min(a[2] * a[3], b[2] * b[3])
+
+    def _detect(self, image, min_size, max_size=None):
+        """Return boxes in the coordinates of the (downscaled) image"""
+        raise NotImplementedError
+
+class CascadeBackend(DetectorBackend):
+    """OpenCV cascade classifier run through detectMultiScale"""
+
+    verify_eyes = True
+
+    def __init__(self, path, scale=1.0, min_face_size=30, max_face_size=None, regions=None,
+                 scale_factor=1.1, min_neighbors=5):
+        super().__init__(scale, min_face_size, max_face_size, regions)
+        self.path = path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.defaults.update(scale_factor=scale_factor, min_neighbors=min_neighbors)
+        self.cascade = cv2.CascadeClassifier(path) if os.path.exists(path) else None
+        if self.cascade is None or self.cascade.empty():
+            raise FileNotFoundError(f"Could not load {self.name} cascade from {path}")
+
+    def _detect(self, image, min_size, max_size=None):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        return self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size) if max_size else (0, 0)
+        )
+
+class HaarBackend(CascadeBackend):
+    """Haar frontal face cascade shipped with OpenCV"""
+
+    name = "haar"
+
+    def __init__(self, path=None, **kwargs):
+        super().__init__(path or cv2.data.haarcascades + "haarcascade_frontalface_default.xml", **kwargs)
+
+class LBPBackend(CascadeBackend):
+    """LBP frontal face cascade, faster than Haar at slightly lower recall
+
+    OpenCV's Python wheels do not include it; copy
+    lbpcascade_frontalface_improved.xml from opencv/data/lbpcascades into
+    data/models.
+    """
+
+    name = "lbp"
+
+    def __init__(self, path=LBP_CASCADE_PATH, **kwargs):
+        super().__init__(path, **kwargs)
+
+class YuNetBackend(DetectorBackend):
+    """OpenCV's YuNet CNN face detector (cv2.FaceDetectorYN)
+
+    Needs the ONNX model from the OpenCV model zoo in data/models. The
+    network also predicts eye landmarks, so no eye cascade is needed.
+    """
+
+    name = "yunet"
+
+    def __init__(self, path=YUNET_MODEL_PATH, scale=1.0, min_face_size=30, max_face_size=None, regions=None,
+                 score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        super().__init__(scale, min_face_size, max_face_size, regions)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"YuNet model not found at {path}")
+        self.path = path
+        self.detector = cv2.FaceDetectorYN.create(path, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self.input_size = None
+
+    def _detect(self, image, min_size, max_size=None):
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        if self.input_size != (width, height):
+            self.detector.setInputSize((width, height))
+            self.input_size = (width, height)
+
+        _, faces = self.detector.detect(image)
+        if faces is None:
+            return []
+        # Rows are x, y, w, h, five landmark points and the score
+        return [
+            (x, y, w, h) for x, y, w, h in faces[:, :4].round().astype(int)
+            if w >= min_size and h >= min_size and (not max_size or max(w, h) <= max_size)
+        ]
+
+class DetectionTuner:
+    """Narrows a backend's face size range and search region to what it sees
+
+    Sizes and centers of the faces found are kept for the last `history`
+    detections. Once min_samples faces were seen, detection only scans
+    between the 1st and 99th percentile face size, widened by size_margin,
+    and only the area those faces were found in, grown by region_margin
+    face sizes on every side. Place regions, when set, are kept and only
+    the sizes are narrowed. Every full_scan_every-th call scans the
+    backend's full configured range so faces outside it are still found
+    and widen the statistics.
+    """
+
+    def __init__(self, backend, min_samples=30, history=500, full_scan_every=20,
+                 size_margin=0.25, region_margin=1.0):
+        self.backend = backend
+        self.min_samples = min_samples
+        self.full_scan_every = full_scan_every
+        self.size_margin = size_margin
+        self.region_margin = region_margin
+        self.sizes = deque(maxlen=history)
+        self.boxes = deque(maxlen=history)  # (x0, y0, x1, y1) in fractions of the frame
+        self.calls = 0
+        self.full_scans = 0
+        self.tuned = None  # (min_face_size, max_face_size, region) once enough faces were seen
+
+    def detect(self, frame, observe=True):
+        """Detect with the tuned range, or the full range when a scan is due
+
+        observe=False leaves recording the faces to the caller, e.g. after
+        FaceDetector has verified them.
+        """
+        self.calls += 1
+        if self.tuned is None or self.calls % self.full_scan_every == 0:
+            self.full_scans += 1
+            boxes = self.backend.detect(frame)
+        else:
+            min_face_size, max_face_size, region = self.tuned
+            boxes = self.backend.detect(frame, min_face_size, max_face_size,
+                                        [region] if region and not self.backend.regions else None)
+        if observe:
+            self.observe(frame, boxes)
+        return boxes
+
+    def observe(self, frame, boxes):
+        """Record detected faces and update the tuned range"""
+        if not len(boxes):
+            return
+        height, width = frame.shape[:2]
+        for (x, y, w, h) in boxes:
+            self.sizes.append(max(w, h))
+            self.boxes.append((x / width, y / height, (x + w) / width, (y + h) / height))
+        if len(self.sizes) >= self.min_samples:
+            self._tune(width, height)
+
+    def reset(self):
+        """Forget the statistics and scan the full range again"""
+        self.sizes.clear()
+        self.boxes.clear()
+        self.tuned = None
+
+    def _tune(self, width, height):
+        sizes = np.array(self.sizes, dtype=np.float32)
+        low, high = np.percentile(sizes, [1, 99])
+        min_face_size = max(self.backend.min_face_size, int(low * (1 - self.size_margin)))
+        max_face_size = int(high * (1 + self.size_margin))
+        if self.backend.max_face_size:
+            max_face_size = min(max_face_size, self.backend.max_face_size)
+
+        boxes = np.array(self.boxes, dtype=np.float32)
+        x0, y0 = np.percentile(boxes[:, 0], 1), np.percentile(boxes[:, 1], 1)
+        x1, y1 = np.percentile(boxes[:, 2], 99), np.percentile(boxes[:, 3], 99)
+        margin_x = self.region_margin * high / width
+        margin_y = self.region_margin * high / height
+        x0, y0 = max(0.0, x0 - margin_x), max(0.0, y0 - margin_y)
+        x1, y1 = min(1.0, x1 + margin_x), min(1.0, y1 + margin_y)
+        region = None
+        if (x1 - x0) * (y1 - y0) < 0.9:
+            region = [float(x0), float(y0), float(x1 - x0), float(y1 - y0)]
+        self.tuned = (min_face_size, max_face_size, region)
+
+DETECTOR_BACKENDS = {
+    HaarBackend.name: HaarBackend,
+    LBPBackend.name: LBPBackend,
+    YuNetBackend.name: YuNetBackend,
+}
+
+def create_detector_backend(name=None, **kwargs):
+    """Create a face detector backend by name ('haar', 'lbp' or 'yunet')
+
+    Without a name the FACE_DETECTOR_BACKEND environment variable selects
+    the backend, defaulting to 'haar'.
+    """
+    name = name or os.environ.get(DETECTOR_BACKEND_ENV, HaarBackend.name)
+    try:
+        backend_class = DETECTOR_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector backend '{name}', expected one of {sorted(DETECTOR_BACKENDS)}")
+    return backend_class(**kwargs)
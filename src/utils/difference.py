@@ -0,0 +1,154 @@
+import cv2
+import numpy as np
+
+# Maximum expected L2 difference between two 256x256 faces
+MAX_L2 = 100000
+
+# skimage.metrics.structural_similarity defaults for uint8 images
+SSIM_WIN_SIZE = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_DATA_RANGE = 255
+
+def _local_stats(image, win_size):
+    """Return local mean and mean of squares over a uniform window"""
+    mean = cv2.boxFilter(image, cv2.CV_64F, (win_size, win_size), borderType=cv2.BORDER_REFLECT)
+    mean_sq = cv2.boxFilter(image * image, cv2.CV_64F, (win_size, win_size), borderType=cv2.BORDER_REFLECT)
+    return mean, mean_sq
+
+class DifferenceEngine:
+    """Interface of the difference scoring engines"""
+
+    name = None
+
+    def prepare_reference(self, face):
+        """Precompute whatever score() needs from a preprocessed reference face"""
+        raise NotImplementedError
+
+    def score(self, face, reference):
+        """Return (normalized L2 difference 0-100, SSIM) against a prepared reference"""
+        raise NotImplementedError
+
+    def score_batch(self, faces, references):
+        """Score each face against its own prepared reference"""
+        # Per-face work stays cache-resident; stacking the batch into one
+        # large array measured slower for 64x64 and 256x256 faces
+        return [self.score(face, reference) for face, reference in zip(faces, references)]
+
+class SSIMDifference(DifferenceEngine):
+    """Full-resolution SSIM plus L2 difference between preprocessed faces
+
+    Produces the same numbers as skimage's structural_similarity with its
+    default 7x7 uniform window, but the reference side (its local means and
+    variances) is computed once by prepare_reference and reused for every
+    comparison.
+    """
+
+    name = "ssim"
+
+    def __init__(self, win_size=SSIM_WIN_SIZE):
+        self.win_size = win_size
+        n = win_size ** 2
+        self.cov_norm = n / (n - 1)  # sample covariance, as skimage uses
+        self.c1 = (SSIM_K1 * SSIM_DATA_RANGE) ** 2
+        self.c2 = (SSIM_K2 * SSIM_DATA_RANGE) ** 2
+
+    def prepare_reference(self, face):
+        """Precompute the statistics of a preprocessed reference face"""
+        image = face.astype(np.float64)
+        mean, mean_sq = _local_stats(image, self.win_size)
+        return {
+            "image": image,
+            "mean": mean,
+            "var": self.cov_norm * (mean_sq - mean * mean),
+        }
+
+    def score(self, face, reference):
+        """Return (normalized L2 difference 0-100, SSIM) against a prepared reference"""
+        x = face.astype(np.float64)
+        y = reference["image"]
+        ux, uxx = _local_stats(x, self.win_size)
+        uy, vy = reference["mean"], reference["var"]
+        uxy = cv2.boxFilter(x * y, cv2.CV_64F, (self.win_size, self.win_size), borderType=cv2.BORDER_REFLECT)
+        vx = self.cov_norm * (uxx - ux * ux)
+        vxy = self.cov_norm * (uxy - ux * uy)
+
+        s = ((2 * ux * uy + self.c1) * (2 * vxy + self.c2)) / \
+            ((ux * ux + uy * uy + self.c1) * (vx + vy + self.c2))
+        pad = (self.win_size - 1) // 2
+        ssim_score = float(s[pad:-pad, pad:-pad].mean())
+
+        l2_diff = np.linalg.norm(x - y)
+        normalized_diff = min(100, (l2_diff / MAX_L2) * 100)
+        return normalized_diff, ssim_score
+
+class FastDifference(DifferenceEngine):
+    """Reduced-resolution approximation of SSIMDifference
+
+    SSIM is computed on area-downsampled faces (64x64 by default) with
+    3x3 box-filtered local statistics, so it touches 1/16th of the pixels. The
+    L2 term, which drives the accept/reject decision in recognize_face,
+    stays exact at full resolution and is computed directly on the uint8
+    images. See
+    benchmarks/README.md for the accuracy comparison against SSIMDifference.
+    """
+
+    name = "fast"
+
+    def __init__(self, size=64, win_size=3):
+        # A 3x3 window at 64x64 spans 12 full-resolution pixels, close to
+        # the 7x7 window of the full-resolution SSIM
+        self.size = size
+        self.win_size = win_size
+        n = win_size ** 2
+        self.cov_norm = n / (n - 1)
+        self.c1 = (SSIM_K1 * SSIM_DATA_RANGE) ** 2
+        self.c2 = (SSIM_K2 * SSIM_DATA_RANGE) ** 2
+        self.pad = (win_size - 1) // 2
+
+    def _downsample(self, face):
+        return cv2.resize(face, (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def _box(self, image):
+        return cv2.boxFilter(image, cv2.CV_32F, (self.win_size, self.win_size), borderType=cv2.BORDER_REFLECT)
+
+    def prepare_reference(self, face):
+        """Precompute the reduced-resolution statistics of a reference face"""
+        image = self._downsample(face)
+        mean = self._box(image)
+        return {
+            "face": face,
+            "image": image,
+            "mean": mean,
+            "var": self.cov_norm * (self._box(image * image) - mean * mean),
+        }
+
+    def score(self, face, reference):
+        """Return (normalized L2 difference 0-100, SSIM) against a prepared reference"""
+        x = self._downsample(face)
+        y = reference["image"]
+        ux = self._box(x)
+        uy, vy = reference["mean"], reference["var"]
+        vx = self.cov_norm * (self._box(x * x) - ux * ux)
+        vxy = self.cov_norm * (self._box(x * y) - ux * uy)
+
+        s = ((2 * ux * uy + self.c1) * (2 * vxy + self.c2)) / \
+            ((ux * ux + uy * uy + self.c1) * (vx + vy + self.c2))
+        p = self.pad
+        ssim_score = float(s[p:-p, p:-p].mean())
+
+        l2_diff = cv2.norm(face, reference["face"], cv2.NORM_L2)
+        normalized_diff = min(100, (l2_diff / MAX_L2) * 100)
+        return normalized_diff, ssim_score
+
+DIFFERENCE_ENGINES = {
+    SSIMDifference.name: SSIMDifference,
+    FastDifference.name: FastDifference,
+}
+
+def create_difference_engine(name="fast", **kwargs):
+    """Create a difference scoring engine by name ('ssim' or 'fast')"""
+    try:
+        return DIFFERENCE_ENGINES[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown difference engine '{name}', expected one of {sorted(DIFFERENCE_ENGINES)}")
@@ -0,0 +1,51 @@
+import time
+import threading
+
+class EventPolicy:
+    """Decides which recognition results are saved as RecognitionEvents
+
+    Used where no one presses SPACE (multi-camera host, headless runs). A
+    recognized user is recorded once their confidence reaches
+    min_confidence, then not again at the same place until cooldown seconds
+    have passed. A track whose user was just recorded is not recorded again
+    while it stays in view, however long that is.
+    """
+
+    def __init__(self, cooldown=60.0, min_confidence=0, max_tracks=1000):
+        self.cooldown = cooldown
+        self.min_confidence = min_confidence
+        self.max_tracks = max_tracks
+        self.last_recorded = {}    # (place_id, user_id) -> time
+        self.recorded_tracks = {}  # (place_id, track_id) -> user_id
+        self.lock = threading.Lock()
+
+    def should_record(self, place_id, result, now=None):
+        """Return True if this RecognitionResult should be saved now
+
+        now (in seconds) defaults to the monotonic clock; pass the footage
+        time when replaying recordings faster than real time.
+        """
+        if result.user_id is None:
+            return False
+        if result.confidence < self.min_confidence:
+            return False
+
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if result.track_id is not None and \
+                    self.recorded_tracks.get((place_id, result.track_id)) == result.user_id:
+                return False
+            key = (place_id, result.user_id)
+            if now - self.last_recorded.get(key, float('-inf')) < self.cooldown:
+                return False
+            self.last_recorded[key] = now
+            if result.track_id is not None:
+                self.recorded_tracks[(place_id, result.track_id)] = result.user_id
+                # Tracks only ever end, so forget the oldest ones
+                while len(self.recorded_tracks) > self.max_tracks:
+                    del self.recorded_tracks[next(iter(self.recorded_tracks))]
+            return True
+
+    def select(self, place_id, results, now=None):
+        """Return the results that should be saved now"""
+        return [result for result in results if self.should_record(place_id, result, now)]
@@ -0,0 +1,351 @@
+import os
+import time
+import threading
+import cv2
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+from src.database.db_operations import DatabaseOperations
+from src.database.models import DATABASE_PATH
+from src.utils.matching import BatchedMatcher, SCAN_ROWS
+from src.utils.ann_index import IVFIndex
+
+TEMPLATE_SIZE = (256, 256)
+# Compact descriptor used for the approximate candidate search
+DESCRIPTOR_SIZE = (32, 32)
+# ANN index persisted next to the database
+INDEX_PATH = os.path.splitext(DATABASE_PATH)[0] + '.ann.npz'
+# Preprocessed samples persisted next to the database as uint8 rows, with
+# their sample IDs, users and norms in a .npz of the same name, so startup
+# does not decode every image again. The process holding the .lock file
+# writes them, other processes only read them
+TEMPLATES_PATH = os.path.splitext(DATABASE_PATH)[0] + '.templates.u8'
+# Below this many samples an exact scan is already fast enough
+INDEX_MIN_SAMPLES = 2000
+
+class FaceGallery:
+    """In-memory store of preprocessed face samples for all enrolled users"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db=None, use_index=None, index_path=INDEX_PATH, n_probe=8, n_candidates=32,
+                 templates_path=TEMPLATES_PATH):
+        self.db = db or DatabaseOperations()
+        self.users = {}        # user_id -> User
+        # 256x256 grayscale samples, labelled with their user_id and kept in
+        # templates_path (None keeps them in memory only)
+        self.matcher = BatchedMatcher(TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1])
+        self.templates_path = templates_path
+        self.templates_saved_at = 0
+        self.templates_lock = None  # Open .lock file while this process writes the templates
+        self.sample_paths = set()
+        self.sample_rows = {}  # FaceSample.id -> matcher row
+        self.row_sample_ids = []  # matcher row -> FaceSample.id, -1 if unknown
+        # Optional ANN index over compact descriptors; None means decide by size
+        self.use_index = use_index
+        self.index = None
+        self.index_path = index_path
+        self.n_probe = n_probe
+        self.n_candidates = n_candidates
+        self.index_saved_at = 0
+        self.lock = threading.Lock()
+        self.loaded = False
+        DatabaseOperations.subscribe('face_sample_added', self._on_sample_added)
+        DatabaseOperations.subscribe('face_sample_deleted', self._on_sample_deleted)
+
+    @classmethod
+    def shared(cls):
+        """Return the process-wide gallery, loading it on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                cls._shared.load()
+            return cls._shared
+
+    @staticmethod
+    def preprocess(face_img):
+        """Resize and grayscale a face image the same way compare_faces does"""
+        if face_img is None:
+            return None
+        face_img = cv2.resize(face_img, TEMPLATE_SIZE)
+        if len(face_img.shape) == 3:
+            face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        return face_img
+
+    @staticmethod
+    def descriptors(templates):
+        """Downsample preprocessed templates into normalized ANN descriptors"""
+        small = [cv2.resize(t, DESCRIPTOR_SIZE, interpolation=cv2.INTER_AREA) for t in templates]
+        return BatchedMatcher.to_vectors(small)
+
+    def load(self):
+        """Load every face sample from the database
+
+        Samples already in the templates file are used as stored, only new
+        ones are read from disk and preprocessed.
+        """
+        users = {user.id: user for user in self.db.get_all_users()}
+        samples = [sample for sample in self.db.get_all_face_samples() if sample.user_id in users]
+
+        matcher, row_sample_ids = self._open_templates(samples)
+        cached = len(row_sample_ids)
+        stored = set(row_sample_ids)
+        for sample in samples:
+            if sample.id in stored:
+                continue
+            template = self._load_template(sample.image_path)
+            if template is not None:
+                matcher.add([template], [sample.user_id])
+                row_sample_ids.append(sample.id)
+        if len(row_sample_ids) > cached:
+            self._save_templates(matcher, row_sample_ids)
+
+        sample_rows = {sample_id: row for row, sample_id in enumerate(row_sample_ids)}
+        index = None
+        use_index = self.use_index if self.use_index is not None else len(matcher) >= INDEX_MIN_SAMPLES
+        if use_index:
+            index = self._load_index(matcher, row_sample_ids)
+
+        with self.lock:
+            self.users = users
+            self.matcher = matcher
+            self.sample_paths = {sample.image_path for sample in samples if sample.id in sample_rows}
+            self.sample_rows = sample_rows
+            self.row_sample_ids = row_sample_ids
+            self.index = index
+            self.loaded = True
+        print(f"Loaded face gallery with {len(matcher)} samples from {len(users)} users "
+              f"({cached} from {self.templates_path})")
+
+    def add_sample(self, user_id, image_path, sample_id=None):
+        """Preprocess a single new sample and add it to the gallery
+
+        Crossing INDEX_MIN_SAMPLES builds the ANN index (unless use_index
+        is set either way), as load() would have.
+        """
+        if image_path in self.sample_paths:
+            return False
+        template = self._load_template(image_path)
+        if template is None:
+            return False
+
+        user = self.users.get(user_id) or self.db.get_user(user_id)
+        if user is None:
+            return False
+
+        with self.lock:
+            self.users[user_id] = user
+            self.matcher.add([template], [user_id])
+            self.sample_paths.add(image_path)
+            self.row_sample_ids.append(sample_id if sample_id is not None else -1)
+            if sample_id is not None:
+                self.sample_rows[sample_id] = len(self.matcher) - 1
+        self._save_templates(self.matcher, self.row_sample_ids, min_interval=60)
+
+        if self.index is None:
+            if self.use_index is None and len(self.matcher) >= INDEX_MIN_SAMPLES:
+                self.index = self._load_index(self.matcher, list(self.row_sample_ids))
+                print(f"Built ANN index over {len(self.index)} gallery samples")
+        elif sample_id is not None:
+            self.index.add(self.descriptors([template]), [sample_id])
+            self._save_index(self.index, min_interval=60)
+        return True
+
+    def match(self, face_imgs, k=1, min_confidence=0):
+        """Return the top-k (User, confidence) pairs for each face image"""
+        probes = [self.preprocess(face_img) for face_img in face_imgs]
+        valid = [i for i, probe in enumerate(probes) if probe is not None]
+        results = [[] for _ in face_imgs]
+        if not valid:
+            return results
+
+        probes = [probes[i] for i in valid]
+        candidates = None
+        if self.index is not None:
+            candidates = self._index_candidates(probes)
+        matches = self.matcher.top_k(probes, k, min_confidence, candidates=candidates)
+        for i, user_matches in zip(valid, matches):
+            results[i] = [(self.users[user_id], score) for user_id, score in user_matches]
+        return results
+
+    def get_user(self, user_id):
+        """Get the cached User for an ID"""
+        return self.users.get(user_id)
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def _index_candidates(self, probes):
+        """Look up matcher rows of the nearest samples in the ANN index"""
+        ids, _ = self.index.search(self.descriptors(probes), k=self.n_candidates, n_probe=self.n_probe)
+        rows = self.sample_rows
+        return [np.array([rows[i] for i in row_ids if i in rows], dtype=np.int64) for row_ids in ids]
+
+    def _load_index(self, matcher, sample_ids):
+        """Load the persisted ANN index and bring it up to date with the gallery"""
+        index = None
+        if os.path.exists(self.index_path):
+            index = IVFIndex.load(self.index_path, n_probe=self.n_probe)
+        # Samples removed from the database invalidate the stored lists
+        if index is not None and not index.ids.issubset(sample_ids):
+            index = None
+        if index is None:
+            index = IVFIndex(DESCRIPTOR_SIZE[0] * DESCRIPTOR_SIZE[1], n_probe=self.n_probe)
+
+        # Descriptors of new samples come from the stored rows, a chunk at a time
+        missing = [row for row, sample_id in enumerate(sample_ids)
+                   if sample_id >= 0 and sample_id not in index.ids]
+        templates, _, _ = matcher.references()
+        for start in range(0, len(missing), SCAN_ROWS):
+            rows = missing[start:start + SCAN_ROWS]
+            index.add(self.descriptors(templates[rows].reshape(-1, TEMPLATE_SIZE[1], TEMPLATE_SIZE[0])),
+                      [sample_ids[row] for row in rows])
+        if missing:
+            self._save_index(index)
+        return index
+
+    def _save_index(self, index, min_interval=0):
+        """Persist the ANN index, at most once every min_interval seconds"""
+        if self.templates_path is not None and not self._owns_templates():
+            return
+        if time.time() - self.index_saved_at < min_interval:
+            return
+        try:
+            index.save(self.index_path)
+            self.index_saved_at = time.time()
+        except Exception as e:
+            print(f"Error saving ANN index {self.index_path}: {e}")
+
+    def _open_templates(self, samples):
+        """Open the templates file, keeping the rows of samples still in the database
+
+        Returns (matcher, sample ID of each row). Rows of deleted samples
+        are dropped by rewriting the file. Without the templates lock the
+        file is only read: the matcher maps it read-only, or holds a copy of
+        the rows still in use in memory.
+        """
+        dim = TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1]
+        capacity = max(64, len(samples))
+        if self.templates_path is None:
+            return BatchedMatcher(dim, capacity), []
+        writer = self._owns_templates()
+
+        meta_path = os.path.splitext(self.templates_path)[0] + '.npz'
+        meta = None
+        rows = None
+        try:
+            if os.path.exists(meta_path) and os.path.exists(self.templates_path):
+                with np.load(meta_path) as data:
+                    meta = {key: data[key] for key in data.files}
+                # The metadata names the file it describes, which compaction
+                # replaces, so a reader never pairs it with other rows
+                with open(self.templates_path, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    count = len(meta['sample_ids'])
+                    if int(meta['dim']) != dim or int(meta['file_id']) != stat.st_ino or stat.st_size < count * dim:
+                        meta = None
+                    elif count:
+                        rows = np.memmap(f, dtype=np.uint8, mode='r', shape=(count, dim))
+        except Exception as e:
+            print(f"Error loading face templates {meta_path}: {e}")
+            meta = None
+        if meta is None:
+            if not writer:
+                return BatchedMatcher(dim, capacity), []
+            for path in (meta_path, self.templates_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return BatchedMatcher(dim, capacity, path=self.templates_path), []
+
+        current = {sample.id: sample.user_id for sample in samples}
+        sample_ids, user_ids = meta['sample_ids'], meta['user_ids']
+        keep = [row for row, (sample_id, user_id) in enumerate(zip(sample_ids.tolist(), user_ids.tolist()))
+                if current.get(sample_id) == user_id]
+        if not writer:
+            if len(keep) == len(sample_ids):
+                return BatchedMatcher(dim, labels=user_ids, norms=meta['norms'], rows=rows), sample_ids.tolist()
+            matcher = BatchedMatcher(dim, capacity)
+            for start in range(0, len(keep), SCAN_ROWS):
+                chunk = keep[start:start + SCAN_ROWS]
+                matcher.add(rows[chunk], user_ids[chunk])
+            return matcher, sample_ids[keep].tolist()
+
+        if len(keep) < len(sample_ids):
+            # Until the new metadata is saved the rows no longer match it
+            os.remove(meta_path)
+            tmp_path = self.templates_path + '.tmp'
+            compacted = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=(max(len(keep), 1), dim))
+            for start in range(0, len(keep), SCAN_ROWS):
+                compacted[start:start + SCAN_ROWS] = rows[keep[start:start + SCAN_ROWS]]
+            compacted.flush()
+            del rows, compacted
+            os.replace(tmp_path, self.templates_path)
+
+        matcher = BatchedMatcher(dim, capacity, path=self.templates_path,
+                                 labels=user_ids[keep], norms=meta['norms'][keep])
+        if len(keep) < len(sample_ids):
+            self._save_templates(matcher, sample_ids[keep].tolist())
+        return matcher, sample_ids[keep].tolist()
+
+    def _save_templates(self, matcher, sample_ids, min_interval=0):
+        """Flush the templates file and save which sample each row holds
+
+        Rows written after the last save are read from the images again
+        at the next load.
+        """
+        if not self._owns_templates() or time.time() - self.templates_saved_at < min_interval:
+            return
+        meta_path = os.path.splitext(self.templates_path)[0] + '.npz'
+        try:
+            sample_ids = list(sample_ids)
+            matcher.flush()
+            _, user_ids, norms = matcher.references()
+            count = min(len(sample_ids), len(user_ids))
+            tmp_path = meta_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, dim=matcher.dim, file_id=os.stat(self.templates_path).st_ino,
+                         sample_ids=np.array(sample_ids[:count], dtype=np.int64),
+                         user_ids=user_ids[:count], norms=norms[:count])
+            os.replace(tmp_path, meta_path)
+            self.templates_saved_at = time.time()
+        except Exception as e:
+            print(f"Error saving face templates {meta_path}: {e}")
+
+    def _owns_templates(self):
+        """Whether this process writes the templates file, taking its lock if free"""
+        if self.templates_path is None:
+            return False
+        if self.templates_lock is None:
+            lock_file = open(self.templates_path + '.lock', 'a+')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            except OSError:
+                lock_file.close()
+                return False
+            self.templates_lock = lock_file
+        return True
+
+    def _load_template(self, image_path):
+        """Read a sample from disk and preprocess it"""
+        try:
+            return self.preprocess(cv2.imread(image_path))
+        except Exception as e:
+            print(f"Error loading sample {image_path}: {e}")
+            return None
+
+    def _on_sample_added(self, face_sample):
+        """Keep the gallery in sync with DatabaseOperations.add_face_sample"""
+        if self.loaded:
+            self.add_sample(face_sample.user_id, face_sample.image_path, face_sample.id)
+
+    def _on_sample_deleted(self, face_sample):
+        """Rebuild from the database since rows cannot be removed in place"""
+        if self.loaded:
+            self.load()
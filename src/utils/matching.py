@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+
+# Reference rows converted to float32 at a time by a full scan
+SCAN_ROWS = 256
+
+class BatchedMatcher:
+    """Normalized-correlation matcher over a matrix of reference images
+
+    For equally sized images cv2.matchTemplate(..., TM_CCORR_NORMED) reduces
+    to the dot product of the two images flattened and L2-normalized, so
+    references are kept as uint8 rows of one matrix with their norms and a
+    probe (or batch of probes) is scored against the rows with matrix
+    multiplies. With a path the rows live in a memory-mapped file, which
+    persists them and only pages in the rows actually scored.
+    """
+
+    def __init__(self, dim, capacity=64, path=None, labels=None, norms=None, rows=None):
+        """labels and norms describe rows already stored in the file at path
+
+        Alternatively rows holds them read-only (e.g. a memmap of a file
+        another process writes) until rows are added, which copies them
+        into memory.
+        """
+        self.dim = dim
+        self.path = path
+        self.readonly = rows is not None
+        count = 0 if labels is None else len(labels)
+        if self.readonly:
+            capacity = count
+            self.vectors = rows
+        else:
+            capacity = max(capacity, count)
+            self.vectors = self._allocate(capacity)
+        self.labels = np.zeros(capacity, dtype=np.int64)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+        if count:
+            self.labels[:count] = labels
+            self.norms[:count] = norms
+        self.count = count
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def to_vectors(images):
+        """Flatten and L2-normalize a batch of equally sized images"""
+        vectors = np.asarray(images, dtype=np.float32).reshape(len(images), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def add(self, images, labels):
+        """Append reference images with their labels"""
+        if len(images) == 0:
+            return
+        rows = np.asarray(images, dtype=np.uint8).reshape(len(images), self.dim)
+        norms = np.linalg.norm(rows.astype(np.float32), axis=1)
+        norms[norms == 0] = 1
+        with self.lock:
+            needed = self.count + len(rows)
+            if needed > len(self.vectors):
+                capacity = max(needed, 2 * len(self.vectors))
+                if self.path is None or self.readonly:
+                    grown = self._allocate(capacity)
+                    grown[:self.count] = self.vectors[:self.count]
+                else:
+                    # The file keeps its rows, it only needs mapping larger
+                    self.vectors.flush()
+                    grown = self._allocate(capacity)
+                grown_labels = np.zeros(capacity, dtype=np.int64)
+                grown_labels[:self.count] = self.labels[:self.count]
+                grown_norms = np.zeros(capacity, dtype=np.float32)
+                grown_norms[:self.count] = self.norms[:self.count]
+                self.vectors, self.labels, self.norms = grown, grown_labels, grown_norms
+            self.vectors[self.count:needed] = rows
+            self.labels[self.count:needed] = labels
+            self.norms[self.count:needed] = norms
+            self.count = needed
+
+    def references(self):
+        """Return views of the (rows, labels, norms) currently in use"""
+        with self.lock:
+            return self.vectors[:self.count], self.labels[:self.count], self.norms[:self.count]
+
+    def flush(self):
+        """Write rows added to a memory-mapped file out to disk"""
+        with self.lock:
+            if self.path is not None and not self.readonly:
+                self.vectors.flush()
+
+    def scores(self, probes):
+        """Score probes against every reference, as percentages (n_probes x n_refs)"""
+        vectors, _, norms = self.references()
+        probe_vectors = self.to_vectors(probes)
+        scores = np.empty((len(probe_vectors), len(vectors)), dtype=np.float32)
+        for start in range(0, len(vectors), SCAN_ROWS):
+            block = vectors[start:start + SCAN_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = probe_vectors @ block.T
+        return scores / norms * 100
+
+    def top_k(self, probes, k=1, min_score=0, candidates=None):
+        """Return the k best (label, score) pairs per probe, best score per label
+
+        candidates optionally restricts each probe to a subset of reference
+        rows, e.g. the shortlist returned by an approximate index, and only
+        those rows are read.
+        """
+        vectors, labels, norms = self.references()
+        if len(vectors) == 0:
+            return [[] for _ in range(len(probes))]
+
+        if candidates is None:
+            rows = [(labels, row) for row in self.scores(probes)]
+        else:
+            rows = [(labels[c], vectors[c].astype(np.float32) @ probe / norms[c] * 100)
+                    for probe, c in zip(self.to_vectors(probes), candidates)]
+
+        results = []
+        for row_labels, row in rows:
+            if len(row) == 0:
+                results.append([])
+                continue
+            unique_labels, label_index = np.unique(row_labels, return_inverse=True)
+            best = np.full(len(unique_labels), -np.inf, dtype=np.float32)
+            np.maximum.at(best, label_index, row)
+            order = np.argsort(-best)[:k]
+            results.append([
+                (int(unique_labels[i]), float(best[i]))
+                for i in order if best[i] >= min_score
+            ])
+        return results
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        """Room for capacity rows, in memory or mapped from the file at path"""
+        if self.path is None or self.readonly:
+            return np.zeros((capacity, self.dim), dtype=np.uint8)
+        with open(self.path, 'ab') as f:
+            if f.tell() < capacity * self.dim:
+                f.truncate(capacity * self.dim)
+        return np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(capacity, self.dim))
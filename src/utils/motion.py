@@ -0,0 +1,72 @@
+import time
+import cv2
+import numpy as np
+
+class MotionGate:
+    """Decides whether a frame is worth running detection on
+
+    Each frame is reduced to a small blurred grayscale thumbnail and compared
+    with a slowly adapting background (cv2.accumulateWeighted), so gradual
+    lighting changes are absorbed. Sensitivity is set by threshold, the
+    per-pixel intensity change that counts as motion, and min_area, the
+    fraction of thumbnail pixels that must change. After motion the gate
+    stays open for `hold` seconds; touch() extends that while faces are in
+    view. While the scene is idle one frame every keep_alive seconds is
+    still let through.
+    """
+
+    def __init__(self, threshold=25, min_area=0.005, hold=2.0, keep_alive=5.0,
+                 width=80, learning_rate=0.05):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.hold = hold
+        self.keep_alive = keep_alive
+        self.width = width
+        self.learning_rate = learning_rate
+        self.background = None
+        self.active_until = 0
+        self.last_open = 0
+        self.motion = 0.0          # Changed fraction of the last frame
+        self.frames = 0
+        self.skipped = 0
+
+    def update(self, frame):
+        """Feed a frame and return True if it should be processed"""
+        now = time.monotonic()
+        self.frames += 1
+        small = self._thumbnail(frame)
+
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype(np.float32)
+            self.motion = 1.0
+        else:
+            diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+            self.motion = np.count_nonzero(diff > self.threshold) / diff.size
+            cv2.accumulateWeighted(small, self.background, self.learning_rate)
+
+        if self.motion >= self.min_area:
+            self.active_until = now + self.hold
+        if now < self.active_until or now - self.last_open >= self.keep_alive:
+            self.last_open = now
+            return True
+        self.skipped += 1
+        return False
+
+    def touch(self):
+        """Keep the gate open, e.g. while faces are still being detected"""
+        self.active_until = time.monotonic() + self.hold
+
+    def reset(self):
+        """Forget the background so the next frame is processed"""
+        self.background = None
+        self.active_until = 0
+
+    def _thumbnail(self, frame):
+        # Subsample before resizing so large frames stay cheap to reduce
+        step = max(1, frame.shape[1] // (self.width * 4))
+        frame = frame[::step, ::step]
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if len(small.shape) == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
@@ -0,0 +1,237 @@
+import time
+import threading
+from collections import deque
+from itertools import count
+
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+class StageQueue:
+    """Bounded queue between pipeline stages
+
+    When full, put() either waits for room ('block', until the queue is
+    closed or put()'s timeout, if given, runs out), evicts the oldest queued
+    item ('drop_oldest', keeps the freshest frames) or discards the new item
+    ('drop_newest').
+    """
+
+    def __init__(self, maxsize=2, drop_policy="drop_oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', expected one of {DROP_POLICIES}")
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item, timeout=None):
+        """Queue an item, applying the drop policy; returns False if it was dropped"""
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                if self.drop_policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.drop_policy == "drop_oldest":
+                    self.items.popleft()
+                    self.dropped += 1
+                elif not self.condition.wait_for(
+                        lambda: len(self.items) < self.maxsize or self.closed, timeout):
+                    self.dropped += 1
+                    return False
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Return the next item, or None on timeout or once closed and empty"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        """Wake up every waiting producer and consumer"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+class Stage:
+    """One pipeline step, run by its own worker threads
+
+    func receives an item and returns the item for the next stage, or None
+    to drop it. A stage without an input queue is a source: func is called
+    with no arguments in a loop, e.g. to read camera frames. A source's
+    wait(timeout), if given, blocks until it has an item ready and returns
+    False on timeout, so waiting for a camera is not counted as busy time
+    in stats(). Stages that
+    keep state between frames (trackers, schedulers) should use a single
+    worker so items stay in order.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=2, drop_policy="drop_oldest", source=False,
+                 wait=None):
+        self.name = name
+        self.func = func
+        self.wait = wait
+        self.workers = workers
+        self.input = None if source else StageQueue(queue_size, drop_policy)
+        self.output = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self.recent = deque(maxlen=60)  # Completion times for the current rate
+
+    def stats(self):
+        """Return throughput and load of this stage"""
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at if self.started_at else 0
+            recent = list(self.recent)
+            processed, busy = self.processed, self.busy_time
+        fps = (len(recent) - 1) / (recent[-1] - recent[0]) if len(recent) > 1 and recent[-1] > recent[0] else 0.0
+        return {
+            "processed": processed,
+            "fps": fps,
+            "avg_ms": busy / processed * 1000 if processed else 0.0,
+            "utilization": busy / (elapsed * self.workers) if elapsed else 0.0,
+            "queued": len(self.input) if self.input is not None else 0,
+            "dropped": self.input.dropped if self.input is not None else 0,
+        }
+
+    def _run(self, pipeline):
+        while pipeline.running:
+            if self.input is None:
+                if self.wait is not None and not self.wait(0.1):
+                    continue
+                item = None
+            else:
+                item = self.input.get(timeout=0.1)
+                if item is None:
+                    continue
+
+            start = time.perf_counter()
+            try:
+                result = self.func() if self.input is None else self.func(item.payload)
+            except Exception as e:
+                print(f"Error in pipeline stage {self.name}: {e}")
+                result = None
+            end = time.perf_counter()
+
+            if result is None:
+                continue
+            with self.lock:
+                self.processed += 1
+                self.busy_time += end - start
+                self.recent.append(end)
+            if self.input is None:
+                item = PipelineItem(next(pipeline.sequence), result)
+            else:
+                item.payload = result
+            # Blocking queues wait for room until stop() closes them
+            self.output.put(item)
+
+class PipelineItem:
+    """A payload travelling through the pipeline with its input order"""
+
+    __slots__ = ("seq", "payload")
+
+    def __init__(self, seq, payload):
+        self.seq = seq
+        self.payload = payload
+
+class Pipeline:
+    """Chain of stages connected by bounded queues
+
+    Every stage runs in its own worker threads (OpenCV releases the GIL, so
+    capture, detection and recognition overlap on several cores). Results
+    are read from the last stage with get(), which skips items that were
+    overtaken by newer ones, e.g. on the main thread for cv2.imshow.
+    """
+
+    def __init__(self, output_size=2, output_policy="drop_oldest"):
+        self.stages = []
+        self.output = StageQueue(output_size, output_policy)
+        self.sequence = count()
+        self.last_seq = -1
+        self.running = False
+
+    def add_source(self, name, func, wait=None):
+        """Add a stage that produces items by calling func() repeatedly
+
+        wait(timeout) blocks until func() has an item ready, see Stage.
+        """
+        return self.add_stage(name, func, source=True, wait=wait)
+
+    def add_stage(self, name, func, workers=1, queue_size=2, drop_policy="drop_oldest", source=False,
+                  wait=None):
+        """Append a stage; returns the Stage"""
+        stage = Stage(name, func, workers, queue_size, drop_policy, source, wait)
+        if self.stages:
+            self.stages[-1].output = stage.input
+        stage.output = self.output
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        """Start the worker threads of every stage"""
+        self.running = True
+        for stage in self.stages:
+            stage.started_at = time.perf_counter()
+            for i in range(stage.workers):
+                thread = threading.Thread(target=stage._run, args=(self,),
+                                          name=f"pipeline-{stage.name}-{i}", daemon=True)
+                stage.threads.append(thread)
+                thread.start()
+
+    def put(self, payload):
+        """Feed an item into the first stage; returns False if it was dropped
+
+        With the 'block' policy this waits for room until stop().
+        """
+        return self.stages[0].input.put(PipelineItem(next(self.sequence), payload))
+
+    def get(self, timeout=None):
+        """Return the newest finished payload, or None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            item = self.output.get(remaining)
+            if item is None:
+                return None
+            if item.seq > self.last_seq:
+                self.last_seq = item.seq
+                return item.payload
+
+    def stop(self):
+        """Stop every stage and wait for the workers"""
+        self.running = False
+        for stage in self.stages:
+            if stage.input is not None:
+                stage.input.close()
+        self.output.close()
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join(timeout=1.0)
+            stage.threads = []
+
+    def stats(self):
+        """Return the stats() of every stage by name"""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def format_stats(self):
+        """One line per stage with its throughput, for logging"""
+        return "\n".join(
+            f"{name:>10}: {s['fps']:5.1f} fps, {s['avg_ms']:6.1f} ms/item, "
+            f"{s['utilization'] * 100:3.0f}% busy, {s['processed']} done, {s['dropped']} dropped"
+            for name, s in self.stats().items()
+        )
@@ -0,0 +1,310 @@
+import os
+import glob
+import time
+import cv2
+from collections import deque
+from src.utils.camera_controls import CameraControls
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+class FrameSource:
+    """Recorded frames read in order through the CameraControls interface
+
+    Unlike a camera, next_frame() hands out every frame in turn (the caller
+    sets the pace) and returns None once the footage ends, after which
+    is_running is False. With realtime the frames are paced to the footage's
+    frame rate instead, skipping frames the caller is too slow for, so the
+    footage can stand in for a live camera.
+
+    start and stop select a range of frame indices and step keeps every
+    step-th frame, so footage can be split into chunks processed in
+    parallel. position is the index of the last frame returned, timestamp
+    its offset into the footage in seconds and start_time the wall-clock
+    time (seconds since the epoch) the footage begins at.
+    """
+
+    def __init__(self, realtime=False, start=0, stop=None, step=1, start_time=None):
+        self.realtime = realtime
+        self.start_index = start
+        self.stop_index = stop
+        self.step = max(1, step)
+        self.start_time = start_time
+        self.is_running = False
+        self.position = -1
+        self.next_index = 0         # Frame the reader yields next
+        self.timestamp = 0.0
+        self.frames_dropped = 0     # Frames skipped to keep up in realtime
+        self.frame_times = deque(maxlen=60)
+        self.frame = None
+        self.consumed = True
+        self.started_at = None
+
+    @property
+    def fps(self):
+        """Frame rate of the footage"""
+        raise NotImplementedError
+
+    @property
+    def frame_count(self):
+        """Total number of frames, or 0 if unknown"""
+        raise NotImplementedError
+
+    def start(self, device_id=None) -> bool:
+        """Open the footage at the first selected frame
+
+        device_id is accepted for compatibility with CameraControls.
+        """
+        if not self._open():
+            return False
+        self.position = self.start_index - self.step
+        self.next_index = self.start_index
+        self.is_running = True
+        self.started_at = time.monotonic()
+        return True
+
+    def stop(self):
+        """Close the footage"""
+        self.is_running = False
+        self._close()
+
+    def read_frame(self):
+        """Return the next frame, or None at the end of the footage"""
+        return self.next_frame()
+
+    def latest(self, new_only: bool = True):
+        """Return a copy of the last frame returned by next_frame()"""
+        if self.frame is None or (new_only and self.consumed):
+            return None
+        self.consumed = True
+        return self.frame.copy()
+
+    def next_frame(self, timeout: float = 1.0):
+        """Return the next selected frame, or None at the end of the footage"""
+        if not self.is_running:
+            return None
+
+        index = self.position + self.step
+        if self.realtime:
+            # Wait until the next frame is due, or skip the ones already late
+            due = self._due_index()
+            wait = (index - due) / self.fps
+            if wait > 0:
+                time.sleep(min(wait, timeout))
+            elif due > index:
+                late = (due - index) // self.step * self.step
+                self.frames_dropped += late // self.step
+                index += late
+
+        if self.stop_index is not None and index >= self.stop_index:
+            self.is_running = False
+            return None
+        index, frame = self._read(index, index - self.next_index)
+        if frame is None:
+            self.is_running = False
+            return None
+
+        self.position = index
+        self.next_index = index + 1
+        self.timestamp = self._frame_time(index)
+        self.frame = frame
+        self.consumed = True
+        self.frame_times.append(time.monotonic())
+        return frame
+
+    def wait_frame(self, timeout: float = 1.0) -> bool:
+        """Wait up to timeout seconds for the next frame to be due
+
+        Returns whether next_frame() can read it without waiting. Only
+        realtime footage waits; otherwise frames are due immediately.
+        """
+        if not self.is_running:
+            return False
+        if self.realtime:
+            wait = (self.position + self.step - self._due_index()) / self.fps
+            if wait > 0:
+                time.sleep(min(wait, timeout))
+                return wait <= timeout
+        return True
+
+    def format_capture(self):
+        """Describe the footage, like CameraControls.format_capture()"""
+        if self.frame is None:
+            return f"{self.fps:.1f} fps"
+        return f"{self.frame.shape[1]}x{self.frame.shape[0]} @ {self.fps:.1f} fps"
+
+    def measured_fps(self):
+        """Rate frames were recently handed out at"""
+        times = list(self.frame_times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def chunks(self, size):
+        """Split the selected frames into (start, stop) ranges of size frames"""
+        stop = self.stop_index if self.stop_index is not None else self.frame_count
+        if not stop:
+            return [(self.start_index, self.stop_index)]
+        size = max(self.step, size - size % self.step)
+        return [(start, min(start + size, stop)) for start in range(self.start_index, stop, size)]
+
+    def _frame_time(self, index):
+        return index / self.fps
+
+    def _due_index(self):
+        """Index of the frame due now in realtime"""
+        return self.start_index + int((time.monotonic() - self.started_at) * self.fps)
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _read(self, index, skip):
+        """Read frame index, skip frames after the last one read
+
+        Returns (index, frame) for the frame actually read, with frame None
+        at the end of the footage.
+        """
+        raise NotImplementedError
+
+class VideoFileSource(FrameSource):
+    """Frames of a video file, or of an image sequence such as img_%04d.jpg"""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.cap = None
+        self.video_fps = 0
+        self.video_frames = 0
+        self._probe()
+
+    @property
+    def fps(self):
+        return self.video_fps
+
+    @property
+    def frame_count(self):
+        return self.video_frames
+
+    def _probe(self):
+        """Read the frame rate and length without keeping the file open"""
+        cap = cv2.VideoCapture(self.path)
+        self.video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.video_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        cap.release()
+        if self.start_time is None:
+            first_image = self._first_image()
+            if os.path.exists(self.path):
+                # Recordings are usually written as they are captured, so the
+                # file is last modified when the footage ends
+                self.start_time = os.path.getmtime(self.path) - self.video_frames / self.video_fps
+            elif first_image is not None:
+                # Image sequences start when their first image was written
+                self.start_time = os.path.getmtime(first_image)
+            else:
+                self.start_time = time.time()
+
+    def _first_image(self):
+        """First file of an image sequence such as img_%04d.jpg, or None"""
+        if "%" not in self.path:
+            return None
+        for index in (0, 1):
+            try:
+                path = self.path % index
+            except (TypeError, ValueError):
+                return None
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            print(f"Error opening video {self.path}")
+            self.cap.release()
+            return False
+        if self.start_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_index)
+        return True
+
+    def _close(self):
+        if self.cap:
+            self.cap.release()
+
+    def _read(self, index, skip):
+        # grab() skips frames without decoding them
+        for _ in range(skip):
+            if not self.cap.grab():
+                return index, None
+        ret, frame = self.cap.read()
+        return index, frame if ret else None
+
+class ImageSequenceSource(FrameSource):
+    """Frames from a directory of stills or a glob pattern, in name order
+
+    Without an fps, timestamps come from the files' modification times,
+    which suits stills taken at irregular intervals.
+    """
+
+    def __init__(self, path, fps=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.image_fps = fps
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in os.listdir(path)]
+        else:
+            paths = glob.glob(path)
+        self.paths = sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+        if self.start_time is None and self.paths:
+            self.start_time = min(os.path.getmtime(p) for p in self.paths)
+
+    @property
+    def fps(self):
+        return self.image_fps or 1.0
+
+    @property
+    def frame_count(self):
+        return len(self.paths)
+
+    def _frame_time(self, index):
+        if self.image_fps:
+            return index / self.image_fps
+        return os.path.getmtime(self.paths[index]) - self.start_time
+
+    def _open(self):
+        if not self.paths:
+            print(f"Error: no images found in {self.path}")
+            return False
+        return True
+
+    def _read(self, index, skip):
+        stop = len(self.paths) if self.stop_index is None else min(self.stop_index, len(self.paths))
+        while index < stop:
+            frame = cv2.imread(self.paths[index])
+            if frame is not None:
+                return index, frame
+            print(f"Error reading image {self.paths[index]}, skipping it")
+            index += self.step
+        return index, None
+
+def parse_source(source):
+    """Device indices are ints, anything else is a path or stream URL"""
+    return int(source) if isinstance(source, str) and source.lstrip('-').isdigit() else source
+
+def is_live_source(source):
+    """Device indices, device nodes and stream URLs are live cameras"""
+    return isinstance(source, int) or "://" in source or source.startswith("/dev/")
+
+def create_frame_source(source, realtime=False, fps=None, profile=None, **kwargs):
+    """Open a camera, video file, image sequence or directory of stills
+
+    Live sources return a CameraControls bound to the device and capture
+    profile, recorded ones a FrameSource; both are started with start().
+    """
+    source = parse_source(source)
+    if is_live_source(source):
+        return CameraControls(device_id=source, profile=profile)
+    if os.path.isdir(source) or any(c in source for c in "*?["):
+        return ImageSequenceSource(source, fps=fps, realtime=realtime, **kwargs)
+    return VideoFileSource(source, realtime=realtime, **kwargs)
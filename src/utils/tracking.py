@@ -0,0 +1,228 @@
+import cv2
+from collections import deque
+from itertools import count
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+def centroid_distance(a, b):
+    """Distance between box centers relative to the mean box size"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    size = (aw + ah + bw + bh) / 4
+    return (dx * dx + dy * dy) ** 0.5 / max(size, 1)
+
+class Track:
+    """A face followed across frames"""
+
+    def __init__(self, track_id, box, history_size=10):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.history = deque(maxlen=history_size)  # Per-face smoothing history
+        self.result = None          # Last recognition result for this face
+        self.confidence = 0         # Recognition confidence, decays every frame
+        self.frames_since_recognition = 0
+        self.missed = 0             # Consecutive frames without a matching detection
+        self.hits = 1
+
+    def __repr__(self):
+        return f"<Track(id={self.track_id}, box={self.box}, confidence={self.confidence:.1f})>"
+
+class FaceTracker:
+    """Associates detections across frames so each face keeps a stable track ID
+
+    Detections are matched to existing tracks greedily by IoU, falling back
+    to centroid distance for fast movers. A track is re-recognized every
+    recognize_every frames, or sooner once its decaying confidence drops
+    below refresh_confidence.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=5,
+                 recognize_every=15, confidence_decay=0.97, refresh_confidence=50):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.recognize_every = recognize_every
+        self.confidence_decay = confidence_decay
+        self.refresh_confidence = refresh_confidence
+        self.tracks = []
+        self._ids = count(1)
+
+    def update(self, boxes):
+        """Match this frame's boxes to tracks and return the visible tracks"""
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for b, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((1 + iou, t, b))
+                else:
+                    distance = centroid_distance(track.box, box)
+                    if distance <= self.max_centroid_distance:
+                        pairs.append((1 - distance, t, b))
+
+        matched_tracks, matched_boxes = set(), set()
+        for _, t, b in sorted(pairs, reverse=True):
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            track = self.tracks[t]
+            track.box = boxes[b]
+            track.missed = 0
+            track.hits += 1
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(Track(next(self._ids), box))
+
+        for track in self.tracks:
+            track.frames_since_recognition += 1
+            track.confidence *= self.confidence_decay
+        return [track for track in self.tracks if track.missed == 0]
+
+    def needs_recognition(self, track):
+        """Whether the full recognizer should run on this track now"""
+        if track.result is None or track.frames_since_recognition >= self.recognize_every:
+            return True
+        # Known faces are refreshed early once their confidence has decayed
+        return track.result.user_id is not None and track.confidence < self.refresh_confidence
+
+    def set_result(self, track, result):
+        """Record a fresh recognition result for a track"""
+        track.result = result
+        track.confidence = result.confidence
+        track.frames_since_recognition = 0
+
+    def reset(self):
+        """Drop all tracks"""
+        self.tracks = []
+
+class DetectionScheduler:
+    """Runs a face detector every N frames and tracks boxes in between
+
+    Between detector runs each box is carried forward by searching for its
+    last detected appearance in a window around its previous position on a
+    downscaled grayscale frame. The detector runs again after `interval`
+    frames, or immediately when any box's match score drops below
+    min_track_score. With adaptive=True the interval grows while the
+    detector keeps confirming the tracked boxes and falls back to
+    min_interval whenever the scene changes. While no face is tracked the
+    detector runs every reacquire_interval frames, so an empty scene does
+    not cost a detection per frame.
+    """
+
+    def __init__(self, detect, interval=5, adaptive=True, min_interval=2, max_interval=15,
+                 min_track_score=0.6, track_scale=0.5, search_margin=0.5, reacquire_interval=3):
+        self.detect = detect
+        self.adaptive = adaptive
+        self.min_interval = min_interval if adaptive else interval
+        self.max_interval = max_interval if adaptive else interval
+        self.interval = interval
+        self.min_track_score = min_track_score
+        self.track_scale = track_scale
+        self.search_margin = search_margin
+        self.reacquire_interval = max(1, reacquire_interval)
+        self.boxes = []
+        self.templates = []
+        self.frames_since_detection = self.reacquire_interval  # Detect on the first frame
+        self.detections = 0
+        self.frames = 0
+
+    def update(self, frame):
+        """Return face boxes for this frame, detecting or tracking as scheduled"""
+        self.frames += 1
+        self.frames_since_detection += 1
+
+        if not self.boxes:
+            if self.frames_since_detection < self.reacquire_interval:
+                return []
+            return self._run_detection(frame, self._small_gray(frame))
+
+        small = self._small_gray(frame)
+        if self.frames_since_detection < self.interval:
+            tracked = self._track(small)
+            if tracked is not None:
+                self.boxes = tracked
+                return list(self.boxes)
+
+        return self._run_detection(frame, small)
+
+    def reset(self):
+        """Forget tracked boxes so the next frame runs the detector"""
+        self.boxes = []
+        self.templates = []
+        self.frames_since_detection = self.reacquire_interval
+
+    def _run_detection(self, frame, small):
+        boxes = [tuple(int(v) for v in box) for box in self.detect(frame)]
+        self.detections += 1
+        self.frames_since_detection = 0
+
+        if self.adaptive:
+            if boxes and self._confirms(boxes):
+                self.interval = min(self.max_interval, self.interval + 1)
+            else:
+                self.interval = self.min_interval
+
+        self.boxes = boxes
+        self.templates = [self._crop(small, box) for box in boxes]
+        return list(boxes)
+
+    def _confirms(self, boxes):
+        """Whether a fresh detection agrees with the boxes we were tracking"""
+        if len(boxes) != len(self.boxes):
+            return False
+        return all(max(box_iou(box, tracked) for tracked in self.boxes) >= 0.5 for box in boxes)
+
+    def _track(self, small):
+        """Locate every template near its previous box, or None if any is lost"""
+        s = self.track_scale
+        tracked = []
+        for (x, y, w, h), template in zip(self.boxes, self.templates):
+            if template is None or template.size == 0:
+                return None
+            th, tw = template.shape
+            margin_x = int(w * s * self.search_margin) + 1
+            margin_y = int(h * s * self.search_margin) + 1
+            x0 = max(int(x * s) - margin_x, 0)
+            y0 = max(int(y * s) - margin_y, 0)
+            x1 = min(int(x * s) + tw + margin_x, small.shape[1])
+            y1 = min(int(y * s) + th + margin_y, small.shape[0])
+            window = small[y0:y1, x0:x1]
+            if window.shape[0] < th or window.shape[1] < tw:
+                return None
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+            if score < self.min_track_score:
+                return None
+            tracked.append((int((x0 + mx) / s), int((y0 + my) / s), w, h))
+        return tracked
+
+    def _small_gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+        if self.track_scale == 1:
+            return gray
+        return cv2.resize(gray, None, fx=self.track_scale, fy=self.track_scale, interpolation=cv2.INTER_AREA)
+
+    def _crop(self, small, box):
+        s = self.track_scale
+        x, y, w, h = box
+        return small[max(int(y * s), 0):int((y + h) * s), max(int(x * s), 0):int((x + w) * s)].copy()
@@ -0,0 +1,51 @@
+import os
+import sys
+from datetime import datetime, timezone
+import cv2
+import numpy as np
+from skimage import data
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_recognition
+from src.database.db_operations import DatabaseOperations
+from src.utils.detectors import create_detector_backend
+from src.utils.sources import VideoFileSource, create_frame_source
+
+def test_batch_recognition_of_printf_image_sequence(tmp_path, monkeypatch):
+    """img_%04d.jpg sequences are recognized and timed from their first image"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/face_samples")
+    os.makedirs("footage")
+
+    astronaut = cv2.cvtColor(data.astronaut(), cv2.COLOR_RGB2BGR)
+    frame = np.full((480, 640, 3), 80, np.uint8)
+    frame[0:400, 100:500] = astronaut[0:400, 50:450]
+    for i in range(5):
+        cv2.imwrite(f"footage/img_{i:04d}.jpg", frame)
+
+    source = create_frame_source("footage/img_%04d.jpg")
+    assert isinstance(source, VideoFileSource)
+    assert source.start()
+    still = source.next_frame()
+    source.stop()
+
+    # Enroll crops of the decoded footage so the faces match exactly
+    db = DatabaseOperations()
+    user = db.add_user("astronaut")
+    place = db.add_place("Door")
+    x, y, w, h = create_detector_backend("haar").detect(still)[0]
+    for i in range(3):
+        path = f"data/face_samples/astronaut_{i}.png"
+        cv2.imwrite(path, still[y:y + h, x:x + w])
+        db.add_face_sample(user.id, path)
+
+    monkeypatch.setattr(sys, "argv", ["batch_recognition.py", "footage/img_%04d.jpg",
+                                      "--place", str(place.id), "--workers", "1"])
+    batch_recognition.main()
+
+    events = DatabaseOperations().get_place_recognition_events(place.id)
+    assert [event.user_id for event in events] == [user.id]
+    started = datetime.fromtimestamp(os.path.getmtime("footage/img_0000.jpg"), timezone.utc).replace(tzinfo=None)
+    assert abs((events[0].timestamp - started).total_seconds()) < 1
+    assert os.path.exists(events[0].image_path)
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from skimage import data
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_recognition import FaceRecognitionSystem
+from src.database.db_operations import DatabaseOperations
+
+def enroll_users(samples_per_user=12):
+    """Enroll a few users with shifted crops of the scikit-image samples"""
+    os.makedirs("data/face_samples")
+    db = DatabaseOperations()
+    probes = []
+    for name, image in [("astronaut", data.astronaut()), ("camera", data.camera()),
+                        ("coffee", data.coffee()), ("chelsea", data.chelsea())]:
+        user = db.add_user(name)
+        for i in range(samples_per_user):
+            path = f"data/face_samples/{name}_{i}.png"
+            cv2.imwrite(path, image[i * 3:i * 3 + 200, i * 2:i * 2 + 200])
+            db.add_face_sample(user.id, path)
+        probes.append(image[0:200, 0:200])
+    return probes
+
+def best_time(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def test_recognition_does_not_depend_on_training_workers(tmp_path, monkeypatch):
+    """The worker count only speeds up training, shards follow the sample count"""
+    monkeypatch.chdir(tmp_path)
+    probes = enroll_users()
+
+    serial = FaceRecognitionSystem(training_workers=1, shard_size=16)
+    parallel = FaceRecognitionSystem(training_workers=8, shard_size=16)
+    parallel.load_known_faces(use_cache=False)
+    assert len(serial.recognizers) == len(parallel.recognizers) == 3
+
+    faces = [serial.preprocess_face(probe) for probe in probes]
+    assert serial._score_faces(faces) == parallel._score_faces(faces)
+    assert [user_id for user_id, *_ in serial._score_faces(faces)] == [1, 2, 3, 4]
+
+    serial_time = best_time(lambda: serial._score_faces(faces))
+    parallel_time = best_time(lambda: parallel._score_faces(faces))
+    assert parallel_time < serial_time * 1.5
+
+def test_enrollment_trains_in_background_and_merges_shards(tmp_path, monkeypatch):
+    """Enrolled samples are recognized and folded back into shard_size shards"""
+    monkeypatch.chdir(tmp_path)
+    enroll_users()
+    face_system = FaceRecognitionSystem(training_workers=1, shard_size=16)
+    face_system.recent_shard_size = 8
+
+    db = DatabaseOperations()
+    user = db.add_user("rocket")
+    rocket = data.rocket()
+    for i in range(20):
+        path = f"data/face_samples/rocket_{i}.png"
+        cv2.imwrite(path, rocket[i * 3:i * 3 + 200, i * 2:i * 2 + 200])
+        db.add_face_sample(user.id, path)
+    assert face_system.wait_for_enrollment(timeout=60)
+
+    # 68 samples fit in 5 shards of 16, plus at most one of recent samples
+    assert len(face_system.recognizers) <= 6
+    assert face_system.base_rows + len(face_system.recent_faces) == 68
+    face = face_system.preprocess_face(rocket[0:200, 0:200])
+    assert face_system._score_faces([face])[0][0] == user.id
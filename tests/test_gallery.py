@@ -0,0 +1,38 @@
+import os
+import sys
+import cv2
+from skimage import data
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.db_operations import DatabaseOperations
+from src.utils.gallery import FaceGallery, TEMPLATES_PATH
+
+def test_only_the_lock_holder_writes_the_templates(tmp_path, monkeypatch):
+    """A second gallery reads the persisted rows but never changes the file"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/face_samples")
+    db = DatabaseOperations()
+    user = db.add_user("astronaut")
+    astronaut = data.astronaut()
+    for i in range(4):
+        path = f"data/face_samples/astronaut_{i}.png"
+        cv2.imwrite(path, astronaut[i * 5:i * 5 + 200, 150:350])
+        db.add_face_sample(user.id, path)
+
+    writer = FaceGallery()
+    writer.load()
+    reader = FaceGallery()
+    reader.load()
+    assert writer.templates_lock is not None and reader.templates_lock is None
+    assert reader.matcher.readonly and len(reader) == 4
+
+    before = os.stat(TEMPLATES_PATH)
+    cv2.imwrite("data/face_samples/astronaut_4.png", astronaut[40:240, 150:350])
+    db.add_face_sample(user.id, "data/face_samples/astronaut_4.png")
+    db.delete_face_sample(db.get_all_face_samples()[0].id)
+    assert len(writer) == len(reader) == 4
+    assert os.stat(TEMPLATES_PATH).st_ino != before.st_ino  # Compacted by the writer only
+
+    matches = reader.match([astronaut[40:240, 150:350]])[0]
+    assert matches[0][0].id == user.id and matches[0][1] > 99
@@ -411,13 +411,9 @@ class FaceRecognitionUI:
                     frame = camera.read_frame()
                     if frame is not None:
                         # Perform face recognition
-                        user_id, confidence = face_system.recognize_face(frame)
+                        user_id, user_name, confidence, _ = face_system.recognize_face(frame)
                         
-                        if user_id:
-                            # Get user name
-                            user = self.db.get_user(user_id)
-                            user_name = user.name if user else "Unknown"
-                            
+                        if user_id is not None:
                             # Show recognition info on frame
                             display_text = f"{user_name} ({confidence:.1f}%)"
                             cv2.putText(frame, display_text,
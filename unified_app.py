@@ -2,11 +2,14 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import cv2
 import os
+import threading
 from datetime import datetime
 from src.database.db_operations import DatabaseOperations
 from src.utils.camera_controls import CameraControls
 from src.utils.ui_feedback import UIFeedback
 from src.utils.detection import FaceDetector
+from src.utils.tracking import DetectionScheduler
+from src.utils.motion import MotionGate
 
 class UnifiedApp:
     def __init__(self):
@@ -15,6 +18,9 @@ class UnifiedApp:
         self.root.geometry("1024x768")
         self.db = DatabaseOperations()
         self.setup_ui()
+        # Find the camera in the background; every camera window then
+        # reopens the remembered device instead of probing
+        threading.Thread(target=CameraControls.select_device, daemon=True).start()
         
     def setup_ui(self):
         """Set up the main UI components"""
@@ -234,6 +240,8 @@ class UnifiedApp:
             # Initialize camera and detector
             camera = CameraControls()
             detector = FaceDetector()
+            scheduler = DetectionScheduler(detector.detect_faces)
+            motion = MotionGate()
             
             def on_capture(filename, image_bytes):
                 # Handle capture based on mode
@@ -273,12 +281,18 @@ class UnifiedApp:
                 if camera.is_running:
                     frame = camera.read_frame()
                     if frame is not None:
-                        # Detect faces
-                        faces = detector.detect_faces(frame)
+                        # Detect faces while something moves in front of the camera
+                        faces = []
+                        if motion.update(frame):
+                            faces = scheduler.update(frame)
+                            if faces:
+                                motion.touch()
+                        else:
+                            scheduler.reset()
                         
                         # Process based on mode
                         if mode == "recognition":
-                            frame = detector.draw_faces(frame, faces)
+                            frame = detector.draw_faces(frame, detector.describe(frame, faces, recognize=True))
                         else:
                             # Simple detection boxes for other modes
                             for (x, y, w, h) in faces: